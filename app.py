@@ -1,18 +1,22 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_file, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade, stamp
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_shutdown
 import pandas as pd
 import numpy as np
 import joblib
 import os
+import uuid
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.utils
+import io
 import json
+import base64
 import logging
 from config import Config
 
@@ -26,7 +30,7 @@ app.config.from_object(Config)
 
 # Extensions
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 mail = Mail(app)
 
 # Configuration de Celery
@@ -74,6 +78,8 @@ class PredictionHistory(db.Model):
     transaction_date = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_fraud_confirmed = db.Column(db.Boolean, default=None)
+    model_version = db.Column(db.String(100))
+    is_degraded = db.Column(db.Boolean, default=False)
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -94,6 +100,67 @@ class ModelPerformance(db.Model):
     training_date = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=False)
 
+class BatchJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    rows_total = db.Column(db.Integer)
+    rows_done = db.Column(db.Integer, default=0)
+    frauds = db.Column(db.Integer, default=0)
+    rows_rejected = db.Column(db.Integer, default=0)
+    duplicates = db.Column(db.Integer, default=0)  # lignes identiques non rescorées
+    seconds = db.Column(db.Float, default=0.0)
+    seconds_saved = db.Column(db.Float)  # temps de scoring évité par la déduplication (estimation)
+    workers = db.Column(db.Integer)
+    resumes = db.Column(db.Integer, default=0)
+    input_path = db.Column(db.String(500))
+    result_path = db.Column(db.String(500))
+    reject_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)  # battement de coeur du worker, écrit à chaque point de contrôle
+    run_id = db.Column(db.String(32))  # exécution propriétaire du lot (seule à pouvoir l'écrire)
+    
+    def is_stale(self, timeout):
+        """Lot 'running' dont le worker ne donne plus signe de vie depuis timeout secondes"""
+        heartbeat = self.updated_at or self.started_at
+        return self.status == 'running' and (heartbeat is None or datetime.utcnow() - heartbeat > timedelta(seconds=timeout))
+    
+    @property
+    def rows_per_second(self):
+        return round(self.rows_done / self.seconds, 1) if self.seconds else None
+    
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100.0
+        return round(min(100.0, self.rows_done / self.rows_total * 100), 1) if self.rows_total else 0.0
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_done': self.rows_done,
+            'rows_total': self.rows_total,
+            'progress': self.progress,
+            'frauds': self.frauds,
+            'rows_rejected': self.rows_rejected or 0,
+            'duplicates': self.duplicates or 0,
+            'seconds_saved': round(self.seconds_saved or 0.0, 3),
+            'seconds': round(self.seconds or 0.0, 3),
+            'rows_per_second': self.rows_per_second,
+            'workers': self.workers,
+            'resumes': self.resumes or 0,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -172,7 +239,7 @@ TRANSLATIONS = {
         'prediction_error': 'Erreur lors de la prédiction',
         'file_error': 'Erreur lors du traitement du fichier',
         'no_file_selected': 'Aucun fichier sélectionné',
-        'csv_required': 'Veuillez sélectionner un fichier CSV',
+        'csv_required': 'Veuillez sélectionner un fichier CSV, Parquet ou Arrow',
         'model_trained': 'Modèle entraîné avec succès',
         'training_error': 'Erreur lors de l\'entraînement du modèle',
         'report_generated': 'Rapport généré avec succès',
@@ -289,6 +356,7 @@ TRANSLATIONS = {
         'fraud_detected': 'Fraude Détectée',
         'transaction_safe': 'Transaction Sécurisée',
         'confidence_level': 'Niveau de Confiance',
+        'degraded_score': 'Score de repli (délai de scoring dépassé)',
         'transaction_details': 'Détails de la Transaction',
         'features_analyzed': 'Caractéristiques analysées',
         'analysis_time': 'Temps d\'analyse',
@@ -395,9 +463,19 @@ TRANSLATIONS = {
         'analysis_time_per_transaction': 'Temps d\'analyse: ~1 seconde par transaction',
         'exportable_results': 'Résultats exportables en PDF/Excel',
         'tip': 'Astuce',
-        'features_tip': 'Les caractéristiques (features) doivent être des valeurs numériques normalisées entre -1 et 1.',
+        'features_tip': 'Les caractéristiques (features) sont les valeurs brutes des 13 colonnes de creditcarddata.csv (montant, heure, jour...), sans normalisation : le modèle applique lui-même sa mise à l\'échelle.',
         'recent_statistics': 'Statistiques Récentes',
         'batch_analysis_results': 'Résultats de l\'Analyse par Lots',
+        'rows_per_second': 'lignes/s',
+        'no_batch_job': 'Aucune analyse par lots trouvée',
+        'batch_in_progress': 'Analyse en cours',
+        'batch_failed': 'L\'analyse par lots a échoué',
+        'rejected_rows': 'lignes rejetées',
+        'duplicate_rows': 'doublons non rescorés',
+        'time_saved': 'temps économisé',
+        'download_rejects': 'Télécharger les rejets',
+        'export_parquet': 'Exporter Parquet',
+        'page': 'Page',
         'analyzed_transactions': 'Transactions analysées',
         'fraudulent_transactions': 'Transactions frauduleuses',
         'search': 'Rechercher',
@@ -490,7 +568,7 @@ TRANSLATIONS = {
         'prediction_error': 'Error during prediction',
         'file_error': 'Error processing file',
         'no_file_selected': 'No file selected',
-        'csv_required': 'Please select a CSV file',
+        'csv_required': 'Please select a CSV, Parquet or Arrow file',
         'model_trained': 'Model trained successfully',
         'training_error': 'Error during model training',
         'report_generated': 'Report generated successfully',
@@ -607,6 +685,7 @@ TRANSLATIONS = {
         'fraud_detected': 'Fraud Detected',
         'transaction_safe': 'Transaction Safe',
         'confidence_level': 'Confidence Level',
+        'degraded_score': 'Fallback score (scoring deadline exceeded)',
         'transaction_details': 'Transaction Details',
         'features_analyzed': 'Features analyzed',
         'analysis_time': 'Analysis time',
@@ -713,9 +792,19 @@ TRANSLATIONS = {
         'analysis_time_per_transaction': 'Analysis time: ~1 second per transaction',
         'exportable_results': 'Exportable results in PDF/Excel',
         'tip': 'Tip',
-        'features_tip': 'Features must be numeric values normalized between -1 and 1.',
+        'features_tip': 'Features are the raw values of the 13 creditcarddata.csv columns (amount, hour, day...), not normalized: the model applies its own scaling.',
         'recent_statistics': 'Recent Statistics',
         'batch_analysis_results': 'Batch Analysis Results',
+        'rows_per_second': 'rows/s',
+        'no_batch_job': 'No batch analysis found',
+        'batch_in_progress': 'Analysis in progress',
+        'batch_failed': 'Batch analysis failed',
+        'rejected_rows': 'rejected rows',
+        'duplicate_rows': 'duplicates not re-scored',
+        'time_saved': 'time saved',
+        'download_rejects': 'Download rejects',
+        'export_parquet': 'Export Parquet',
+        'page': 'Page',
         'analyzed_transactions': 'Analyzed transactions',
         'fraudulent_transactions': 'Fraudulent transactions',
         'search': 'Search',
@@ -762,6 +851,42 @@ def get_locale():
 def utility_processor():
     return dict(_=_, get_locale=get_locale)
 
+def decode_transaction_data(blobs):
+    """Décode des transaction_data JSON en un seul appel au parseur de pandas (lines=True)
+
+    Retourne (features float64 (n, 13), masque des lignes complètes).
+    """
+    frame = pd.read_json(io.StringIO('\n'.join(blobs)), lines=True)
+    features = frame.reindex(columns=[f'feature_{i}' for i in range(1, 14)]).to_numpy(dtype=np.float64)
+    return features, ~np.isnan(features).any(axis=1)
+
+def labelled_history_batches(chunk_rows=100000):
+    """Lots (features, labels) des prédictions dont la fraude a été confirmée ou infirmée
+
+    Curseur côté serveur (yield_per) sur les deux seules colonnes utiles ; chaque lot de
+    transaction_data est décodé en un seul appel au parseur JSON de pandas (lines=True),
+    limité à 10 000 lignes pour borner la mémoire.
+    """
+    chunk_rows = min(chunk_rows, 10000)
+    
+    def decode(blobs, labels):
+        features, complete = decode_transaction_data(blobs)
+        return features[complete], np.asarray(labels, dtype=np.int64)[complete]
+    
+    with app.app_context():
+        query = db.session.query(PredictionHistory.transaction_data, PredictionHistory.is_fraud_confirmed).filter(
+            PredictionHistory.is_fraud_confirmed.isnot(None)
+        ).order_by(PredictionHistory.id)
+        blobs, labels = [], []
+        for transaction_data, is_fraud in query.yield_per(chunk_rows):
+            blobs.append(transaction_data)
+            labels.append(int(is_fraud))
+            if len(blobs) >= chunk_rows:
+                yield decode(blobs, labels)
+                blobs, labels = [], []
+        if blobs:
+            yield decode(blobs, labels)
+
 # Import des services avec gestion d'erreur
 try:
     from services.email_service import EmailService
@@ -770,13 +895,79 @@ try:
     from services.report_generator import ReportGenerator
     from services.translation_service import TranslationService
     from model.online_learner import OnlineLearner
+    from model.feedback_log import FeedbackLog
+    from model.scoring_engine import ScoringEngine, FEATURE_COLUMNS
+    from model.request_coalescer import RequestCoalescer
+    from model.model_registry import ModelRegistry
+    from model.shadow_scorer import ShadowScorer
+    from model.drift_monitor import DriftMonitor
+    from services.batch_processor import BatchProcessor, RESULT_SCHEMA, input_format, result_records
+    from services.columnar_store import ColumnarStore
+    from services.parallel_scorer import ParallelScorer
+    from services.result_export import EXPORT_FORMATS, export_batch_results, export_batch_parquet, export_prediction_history
     
     email_service = EmailService(app)
     sms_service = SMSService(app)
     bank_api = BankAPIService(app)
     report_generator = ReportGenerator()
     translator = TranslationService()
-    online_learner = OnlineLearner()
+    model_registry = ModelRegistry(app.config['MODEL_REGISTRY_PATH'])
+    model_registry.import_legacy(app.config['MODEL_PATH'])
+    online_learner = OnlineLearner(
+        registry=model_registry,
+        training_data_path=os.path.join(app.config['TRAINING_DATA_PATH'], 'creditcarddata.csv'),
+        history_source=labelled_history_batches,
+        batch_size=app.config['ONLINE_BATCH_SIZE'],
+        max_age=app.config['ONLINE_FLUSH_SECONDS'],
+        checkpoint_interval=app.config['ONLINE_CHECKPOINT_SECONDS'],
+        checkpoint_updates=app.config['ONLINE_CHECKPOINT_UPDATES'],
+        snapshot_path=app.config['ONLINE_SNAPSHOT_PATH'],
+        snapshot_interval=app.config['ONLINE_SNAPSHOT_SECONDS'],
+        check_interval=app.config['MODEL_CHECK_INTERVAL'],
+        feedback_log=FeedbackLog(app.config['FEEDBACK_LOG_PATH']),
+        writer=app.config['ONLINE_LEARNER_WRITER']
+    )
+    scoring_engine = ScoringEngine(
+        app.config['MODEL_PATH'],
+        threshold=app.config['SCORING_THRESHOLD'],
+        compiled_max_rows=app.config['SCORING_COMPILED_MAX_ROWS'],
+        mmap=app.config['MODEL_MMAP'],
+        registry=model_registry,
+        check_interval=app.config['MODEL_CHECK_INTERVAL'],
+        cascade_band=(tuple(float(v) for v in app.config['SCORING_CASCADE_BAND'].split(','))
+                      if app.config['SCORING_CASCADE_ENABLED'] else None),
+        deadline_workers=app.config['SCORING_DEADLINE_WORKERS'],
+        weights_snapshot_path=app.config['ONLINE_SNAPSHOT_PATH']
+    )
+    # Repli sans challenger linéaire: poids fusionnés de l'apprentissage en ligne
+    scoring_engine.fallback = lambda X: online_learner.predict(X)[1][:, 1]
+    scoring_engine.fallback_version = 'online-fallback'
+    if app.config['SHADOW_ENABLED']:
+        shadow_versions = [int(v) for v in app.config['SHADOW_VERSIONS'].split(',') if v.strip()]
+        shadow_scorer = ShadowScorer.from_registry(
+            model_registry,
+            shadow_versions or model_registry.challenger_versions(),
+            output_dir=app.config['SHADOW_OUTPUT_PATH'],
+            threshold=app.config['SCORING_THRESHOLD']
+        )
+        scoring_engine.listeners.append(shadow_scorer)
+    if app.config['DRIFT_ENABLED']:
+        scoring_engine.listeners.append(DriftMonitor(
+            app.config['DRIFT_REFERENCE_PATH'],
+            output_dir=app.config['DRIFT_OUTPUT_PATH'],
+            flush_interval=app.config['DRIFT_FLUSH_SECONDS']
+        ))
+    scoring_coalescer = RequestCoalescer(
+        scoring_engine.score_versioned,
+        max_wait_ms=app.config['SCORING_COALESCE_WAIT_MS'],
+        max_batch_rows=app.config['SCORING_COALESCE_MAX_ROWS']
+    )
+    batch_processor = BatchProcessor(
+        scoring_engine,
+        upload_dir=app.config['UPLOAD_FOLDER'],
+        chunk_size=app.config['BATCH_CHUNK_ROWS'],
+        dedupe=app.config['BATCH_DEDUPE']
+    )
     
 except ImportError as e:
     logger.warning(f"Services non disponibles: {e}")
@@ -789,7 +980,14 @@ except ImportError as e:
     bank_api = DummyService()
     report_generator = DummyService()
     translator = DummyService()
+    model_registry = DummyService()
     online_learner = DummyService()
+    scoring_engine = DummyService()
+    scoring_coalescer = DummyService()
+    batch_processor = DummyService()
+    EXPORT_FORMATS = {}
+    input_format = lambda filename: None
+    FEATURE_COLUMNS = [f'feature_{i}' for i in range(1, 14)]
 
 # Tâches Celery
 @celery.task
@@ -817,14 +1015,138 @@ def send_alert_async(user_id, alert_type, message, severity='medium'):
     except Exception as e:
         logger.error(f"Erreur envoi alerte: {str(e)}")
 
+class BatchJobLost(Exception):
+    """Le lot a été repris par une autre exécution (battement de coeur jugé périmé)"""
+
+def claim_batch_job(job_id, run_id):
+    """Prend possession d'un lot en attente, en échec ou 'running' sans battement de coeur récent
+
+    UPDATE conditionnel : une seule exécution l'emporte, une relance manuelle et le message
+    redistribué par le broker ne peuvent pas écrire en même temps dans le même point de contrôle.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['BATCH_HEARTBEAT_TIMEOUT'])
+    heartbeat = db.func.coalesce(BatchJob.updated_at, BatchJob.started_at)
+    claimed = db.session.execute(
+        db.update(BatchJob)
+        .where(BatchJob.id == job_id)
+        .where(db.or_(BatchJob.status.in_(('pending', 'failed')),
+                      db.and_(BatchJob.status == 'running', db.or_(heartbeat.is_(None), heartbeat < stale))))
+        .values(status='running', run_id=run_id, error=None, updated_at=now,
+                started_at=db.func.coalesce(BatchJob.started_at, now),
+                resumes=db.case((BatchJob.status == 'pending', BatchJob.resumes),
+                                else_=db.func.coalesce(BatchJob.resumes, 0) + 1))
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+# acks_late : le message n'est acquitté qu'en fin de traitement, un worker tué le rend à la file
+@celery.task(acks_late=True, reject_on_worker_lost=True)
+def process_batch_job(job_id):
+    """Score un fichier CSV téléversé par morceaux et persiste les résultats (stockage colonnaire)
+
+    Relancée après une interruption, la tâche reprend au dernier point de contrôle.
+    Un battement de coeur (updated_at) est écrit après chaque point de contrôle ; la tâche
+    ne démarre pas si une autre exécution vivante possède déjà le lot.
+    """
+    with app.app_context():
+        job = db.session.get(BatchJob, job_id)
+        if job is None:
+            logger.error(f"Lot {job_id} introuvable")
+            return
+        if job.status == 'done':
+            return
+        
+        run_id = uuid.uuid4().hex
+        if not claim_batch_job(job_id, run_id):
+            logger.warning(f"Lot {job_id} déjà pris en charge par une autre exécution ({job.status}), tâche ignorée")
+            return
+        if job.resumes:
+            logger.info(f"Reprise du lot {job_id} (reprise n°{job.resumes})")
+        
+        def update_owned(**values):
+            """Écrit values sur le lot tant que cette exécution en est propriétaire"""
+            updated = db.session.execute(
+                db.update(BatchJob).where(BatchJob.id == job_id, BatchJob.run_id == run_id).values(**values)
+            ).rowcount
+            db.session.commit()
+            if not updated:
+                raise BatchJobLost(f"Lot {job_id} repris par une autre exécution")
+        
+        def progress(rows, frauds, rejected, seconds):
+            update_owned(rows_done=rows, frauds=frauds, rows_rejected=rejected, seconds=seconds,
+                         updated_at=datetime.utcnow())
+        
+        try:
+            store = ColumnarStore(job.result_path, RESULT_SCHEMA)
+            with ParallelScorer(scoring_engine, workers=app.config['BATCH_WORKERS'],
+                                capacity=app.config['BATCH_CHUNK_ROWS']) as scorer:
+                update_owned(workers=scorer.workers if scorer.parallel else 1)
+                # Comptage dans le worker (un fichier de plusieurs Go ne bloque pas la requête de téléversement) ;
+                # une reprise conserve le total déjà enregistré
+                if job.rows_total is None:
+                    update_owned(rows_total=batch_processor.count_rows(job.input_path))
+                summary = batch_processor.process_file(job.input_path, store, progress, scorer, job.reject_path)
+            now = datetime.utcnow()
+            update_owned(status='done', rows_done=summary['rows'], rows_total=summary['rows'],
+                         frauds=summary['frauds'], rows_rejected=summary['rejected'], seconds=summary['seconds'],
+                         duplicates=summary['duplicates'], seconds_saved=summary['seconds_saved'],
+                         updated_at=now, finished_at=now)
+        except BatchJobLost as e:
+            db.session.rollback()
+            logger.warning(f"Lot {job_id} abandonné: {str(e)}")
+            return
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erreur lot {job_id}: {str(e)}")
+            now = datetime.utcnow()
+            try:
+                update_owned(status='failed', error=str(e)[:1000], updated_at=now, finished_at=now)
+            except BatchJobLost:
+                pass
+            return
+        
+        try:
+            os.remove(job.input_path)
+        except OSError as e:
+            logger.warning(f"Suppression du fichier du lot {job_id} impossible: {str(e)}")
+
 @celery.task
 def update_model_async(feedback_data):
     try:
-        online_learner.partial_fit(feedback_data)
-        logger.info("Modèle mis à jour avec succès")
+        # Appliqué par mini-lots (taille ou ancienneté du tampon), pas à chaque retour
+        pending = online_learner.add_feedback(feedback_data)
+        logger.info(f"Retour d'apprentissage reçu ({pending} en attente)")
     except Exception as e:
         logger.error(f"Erreur mise à jour modèle: {str(e)}")
 
+@celery.task
+def update_model_bulk(features, labels):
+    """Retours groupés : matrice float32 (n, 13) et labels int8, octets bruts encodés en base64"""
+    try:
+        features = np.frombuffer(base64.b64decode(features), dtype=np.float32).reshape(-1, 13)
+        labels = np.frombuffer(base64.b64decode(labels), dtype=np.int8)
+        pending = online_learner.add_feedback({'features': features, 'labels': labels})
+        logger.info(f"{len(labels)} retours d'apprentissage groupés reçus ({pending} en attente)")
+    except Exception as e:
+        logger.error(f"Erreur mise à jour modèle (retours groupés): {str(e)}")
+
+@celery.task
+def rebuild_online_model(until=None):
+    """Reconstruit le modèle en ligne depuis le journal des retours (file 'learner', seul écrivain)"""
+    try:
+        rows = online_learner.rebuild_from_feedback_log(until=until)
+        logger.info(f"Modèle en ligne reconstruit depuis {rows} retours")
+    except Exception as e:
+        logger.error(f"Erreur reconstruction modèle en ligne: {str(e)}")
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_online_learner(**kwargs):
+    """Arrêt d'un worker Celery (ou d'un processus prefork, qui ne passe pas par atexit) :
+    les retours en tampon sont appliqués et le modèle publié avant la sortie"""
+    online_learner.close()
+
 # Routes principales
 @app.route('/')
 def index():
@@ -935,9 +1257,19 @@ def prediction():
             amount = float(request.form.get('amount', 0))
             currency = request.form.get('currency', 'USD')
             
-            # Mode démo (modèle non disponible)
-            is_fraud = np.random.choice([True, False], p=[0.1, 0.9])
-            confidence = np.random.uniform(0.7, 0.99) if is_fraud else np.random.uniform(0.8, 0.95)
+            deadline_ms = request.form.get('deadline_ms', app.config['SCORING_DEADLINE_MS'], type=float)
+            submit = (lambda X: scoring_coalescer.submit(X[0])) if app.config['SCORING_COALESCE_ENABLED'] else None
+            if deadline_ms:
+                probabilities, degraded, model_version = scoring_engine.score_within(np.array([features]), deadline_ms, submit=submit)
+            elif app.config['SCORING_COALESCE_ENABLED']:
+                probability, model_version = scoring_coalescer.score_one(features)
+                probabilities, degraded = [probability], False
+            else:
+                probabilities, model_version = scoring_engine.score_versioned(np.array([features]))
+                degraded = False
+            fraud_probability = float(probabilities[0])
+            is_fraud = fraud_probability >= scoring_engine.threshold
+            confidence = fraud_probability if is_fraud else 1 - fraud_probability
             
             history = PredictionHistory(
                 user_id=current_user.id,
@@ -945,7 +1277,9 @@ def prediction():
                 prediction='Fraude' if is_fraud else 'Non Fraude',
                 confidence=confidence,
                 amount=amount,
-                currency=currency
+                currency=currency,
+                model_version=model_version,
+                is_degraded=degraded
             )
             db.session.add(history)
             db.session.commit()
@@ -960,6 +1294,7 @@ def prediction():
                                 features=features,
                                 amount=amount,
                                 currency=currency,
+                                degraded=degraded,
                                 recent_predictions=recent_predictions,
                                 show_results=True)
             
@@ -1137,6 +1472,165 @@ def get_analysis_data():
     
     return jsonify(data)
 
+def parse_score_payload(payload):
+    """Décode le corps JSON de /api/v1/score en matrice float64 contiguë (n, 13)
+
+    Format attendu: {"transactions": [[f1, ..., f13], ...], "columns": [...], "ids": [...], "deadline_ms": 50}
+    "columns" (optionnel) donne l'ordre des colonnes envoyées; "ids" est renvoyé tel quel;
+    "deadline_ms" (optionnel) remplace SCORING_DEADLINE_MS pour cette requête.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('transactions'), list):
+        raise ValueError("Champ 'transactions' (liste de lignes) requis")
+    
+    rows = payload['transactions']
+    if not rows:
+        raise ValueError("Aucune transaction fournie")
+    if len(rows) > app.config['API_SCORE_MAX_ROWS']:
+        raise ValueError(f"Maximum {app.config['API_SCORE_MAX_ROWS']} transactions par requête")
+    
+    # Conversion directe liste de listes -> matrice, sans objet intermédiaire par ligne
+    X = np.array(rows, dtype=np.float64)
+    if X.ndim != 2 or X.shape[1] != len(FEATURE_COLUMNS):
+        raise ValueError(f"Chaque transaction doit contenir {len(FEATURE_COLUMNS)} valeurs numériques")
+    
+    columns = payload.get('columns')
+    if columns:
+        if sorted(columns) != sorted(FEATURE_COLUMNS):
+            raise ValueError(f"'columns' doit contenir exactement: {', '.join(FEATURE_COLUMNS)}")
+        X = np.ascontiguousarray(X[:, [columns.index(col) for col in FEATURE_COLUMNS]])
+    
+    if not np.isfinite(X).all():
+        raise ValueError("Valeurs manquantes ou non finies dans les transactions")
+    
+    ids = payload.get('ids')
+    if ids is not None and len(ids) != len(X):
+        raise ValueError("'ids' doit avoir la même longueur que 'transactions'")
+    
+    deadline_ms = payload.get('deadline_ms', app.config['SCORING_DEADLINE_MS'])
+    if not isinstance(deadline_ms, (int, float)) or deadline_ms < 0:
+        raise ValueError("'deadline_ms' doit être un nombre positif")
+    
+    return X, ids, deadline_ms
+
+# API de scoring JSON pour l'intégration avec le switch de paiement
+@app.route('/api/v1/score', methods=['POST'])
+@login_required
+def api_score():
+    """Score un tableau de transactions en un seul passage"""
+    try:
+        X, ids, deadline_ms = parse_score_payload(json.loads(request.get_data()))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        probabilities, degraded, model_version = scoring_engine.score_within(X, deadline_ms)
+        labels = probabilities >= scoring_engine.threshold
+    except TimeoutError as e:
+        # Délai dépassé sans score de repli (ScoringTimeout) : erreur explicite plutôt qu'une attente sans fin
+        logger.warning(f"API scoring: {str(e)}")
+        return jsonify({'success': False, 'message': 'Délai de scoring dépassé'}), 503
+    except Exception as e:
+        logger.error(f"Erreur API scoring: {str(e)}")
+        return jsonify({'success': False, 'message': 'Erreur serveur'}), 500
+    
+    response = {
+        'success': True,
+        'model_version': model_version,
+        'count': len(X),
+        'degraded': bool(degraded),
+        'probabilities': np.round(probabilities, 6).tolist(),
+        'labels': labels.astype(int).tolist()
+    }
+    if ids is not None:
+        response['ids'] = ids
+    return jsonify(response)
+
+# API de supervision du moteur de scoring
+@app.route('/api/scoring/stats')
+@login_required
+def scoring_stats():
+    """Latence et volume du moteur de scoring de ce worker"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'stats': scoring_engine.get_stats(),
+        'coalescer': scoring_coalescer.get_stats()
+    })
+
+# API du registre de modèles
+@app.route('/api/models/versions')
+@login_required
+def model_versions():
+    """Liste des versions publiées et version active"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    versions = [model_registry.metadata(version) for version in model_registry.versions()]
+    manifest = model_registry.active_manifest() or {}
+    return jsonify({'success': True, 'active': manifest.get('version'), 'live': bool(manifest) and manifest.get('live', True),
+                    'versions': versions})
+
+@app.route('/api/models/activate/<int:version>', methods=['POST'])
+@login_required
+def activate_model_version(version):
+    """Bascule atomique vers une version (promotion ou retour arrière)
+
+    ?live=1 : une version en ligne suit ensuite l'instantané des poids de l'apprenant ;
+    sans live, elle reste figée (retour arrière).
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    live = request.args.get('live', 0, type=int) == 1
+    try:
+        model_registry.activate(version, live=live)
+        return jsonify({'success': True, 'active': version, 'live': live})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+
+@app.route('/api/models/online/rebuild', methods=['POST'])
+@login_required
+def rebuild_online_model_route():
+    """Rejoue le journal des retours dans un modèle en ligne neuf ; ?until=<epoch> pour un retour arrière"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    until = request.args.get('until', type=float)
+    rebuild_online_model.delay(until)
+    return jsonify({'success': True, 'until': until, 'queued': True}), 202
+
+@app.route('/api/models/shadow')
+@login_required
+def shadow_report():
+    """Taux de désaccord et écarts de probabilité des challengers face au champion"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    report = ShadowScorer.merged_report(app.config['SHADOW_OUTPUT_PATH'])
+    # Champion : version active du manifeste du registre (commune à tous les processus), pas
+    # ModelPerformance.is_active que l'activation d'une version ne met pas à jour
+    manifest = model_registry.active_manifest()
+    try:
+        report['active_version'] = manifest['version'] if manifest else scoring_engine.model_version
+        report['active_model'] = model_registry.metadata(manifest['version'])['name'] if manifest else scoring_engine.model_name
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Erreur lecture de la version active: {str(e)}")
+        report['active_model'] = scoring_engine.model_name
+    return jsonify({'success': True, **report})
+
+@app.route('/api/models/drift')
+@login_required
+def drift_report():
+    """Dérive des features et de la probabilité (PSI, KS) fusionnée sur tous les workers, face à la référence d'entraînement"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Accès non autorisé'}), 403
+    
+    report = DriftMonitor.merged_report(app.config['DRIFT_REFERENCE_PATH'], app.config['DRIFT_OUTPUT_PATH'])
+    return jsonify({'success': True, **report})
+
 # API pour feedback d'apprentissage
 @app.route('/api/feedback', methods=['POST'])
 @login_required
@@ -1172,6 +1666,75 @@ def provide_feedback():
         logger.error(f"Erreur feedback: {str(e)}")
         return jsonify({'success': False, 'message': 'Erreur serveur'})
 
+@app.route('/api/feedback/bulk', methods=['POST'])
+@login_required
+def provide_feedback_bulk():
+    """Retours groupés: {"feedback": [{"prediction_id": 1, "actual_label": 0|1}, ...]}
+
+    Une requête IN vérifie l'appartenance et lit les transactions, un seul UPDATE écrit
+    is_fraud_confirmed, et une seule tâche 'learner' reçoit la matrice des features.
+    """
+    try:
+        items = (request.get_json(silent=True) or {}).get('feedback')
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'message': 'Liste feedback attendue'}), 400
+        if len(items) > app.config['FEEDBACK_BULK_MAX_ITEMS']:
+            return jsonify({'success': False, 'message': f"Au plus {app.config['FEEDBACK_BULK_MAX_ITEMS']} retours par appel"}), 413
+        
+        # Un label par prédiction (le dernier l'emporte) ; les entrées mal formées sont comptées puis ignorées
+        labels, invalid = {}, 0
+        for item in items:
+            try:
+                prediction_id, label = int(item['prediction_id']), int(item['actual_label'])
+                if label not in (0, 1):
+                    raise ValueError(label)
+                labels[prediction_id] = label
+            except (KeyError, TypeError, ValueError):
+                invalid += 1
+        
+        rows = db.session.query(PredictionHistory.id, PredictionHistory.transaction_data).filter(
+            PredictionHistory.id.in_(list(labels)),
+            PredictionHistory.user_id == current_user.id
+        ).order_by(PredictionHistory.id).all() if labels else []
+        owned = [prediction_id for prediction_id, _ in rows]
+        not_found = sorted(set(labels) - set(owned))
+        
+        if owned:
+            fraud = [prediction_id for prediction_id in owned if labels[prediction_id] == 1]
+            db.session.execute(
+                db.update(PredictionHistory)
+                .where(PredictionHistory.id.in_(owned))
+                .values(is_fraud_confirmed=db.case((PredictionHistory.id.in_(fraud), True), else_=False))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        
+        queued = 0
+        if owned:
+            features, complete = decode_transaction_data([transaction_data for _, transaction_data in rows])
+            targets = np.array([labels[prediction_id] for prediction_id in owned], dtype=np.int8)[complete]
+            queued = len(targets)
+            if queued:
+                # Mise à jour asynchrone du modèle : une seule tâche, octets bruts plutôt que listes JSON
+                update_model_bulk.delay(
+                    base64.b64encode(features[complete].astype(np.float32).tobytes()).decode('ascii'),
+                    base64.b64encode(targets.tobytes()).decode('ascii')
+                )
+        
+        return jsonify({
+            'success': True,
+            'message': 'Feedback enregistré',
+            'updated': len(owned),
+            'queued': queued,
+            'not_found': not_found,
+            'invalid': invalid
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur feedback groupé: {str(e)}")
+        return jsonify({'success': False, 'message': 'Erreur serveur'}), 500
+
 # API pour intégration bancaire
 @app.route('/api/bank/transactions', methods=['GET'])
 @login_required
@@ -1222,24 +1785,29 @@ def batch_prediction():
                 flash(_('no_file_selected'), 'error')
                 return redirect(url_for('batch_prediction'))
             
-            if file and file.filename.endswith('.csv'):
-                # Lire le fichier CSV
-                df = pd.read_csv(file)
+            if file and input_format(file.filename):
+                # Fichier écrit sur disque puis scoré par morceaux dans un worker Celery
+                job_id = uuid.uuid4().hex
+                input_path = batch_processor.save_upload(file, job_id)
+                job = BatchJob(
+                    id=job_id,
+                    user_id=current_user.id,
+                    filename=file.filename,
+                    input_path=input_path,
+                    result_path=batch_processor.results_path(job_id),
+                    reject_path=batch_processor.rejects_path(job_id)
+                )
+                db.session.add(job)
+                db.session.commit()
+                try:
+                    process_batch_job.delay(job_id)
+                except Exception as e:
+                    job.status = 'failed'
+                    job.error = f"Mise en file impossible: {str(e)}"
+                    db.session.commit()
+                    raise
                 
-                # Simulation d'analyse
-                results = []
-                for index, row in df.iterrows():
-                    is_fraud = np.random.choice([True, False], p=[0.15, 0.85])
-                    confidence = np.random.uniform(0.7, 0.99) if is_fraud else np.random.uniform(0.8, 0.95)
-                    
-                    results.append({
-                        'transaction_id': index + 1,
-                        'amount': row.get('amount', 0) if 'amount' in row else np.random.uniform(10, 1000),
-                        'prediction': 'Fraude' if is_fraud else 'Sécurisé',
-                        'confidence': confidence
-                    })
-                
-                return render_template('batch_results.html', results=results)
+                return redirect(url_for('batch_results_job', job_id=job_id))
             else:
                 flash(_('csv_required'), 'error')
                 
@@ -1249,24 +1817,80 @@ def batch_prediction():
     
     return render_template('batch_prediction.html')
 
-# NOUVELLE ROUTE AJOUTÉE
+def get_batch_job(job_id):
+    """Lot de l'utilisateur courant (ou de n'importe qui pour un administrateur)"""
+    job = db.session.get(BatchJob, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        return None
+    return job
+
+@app.route('/api/batch-jobs/<job_id>')
+@login_required
+def batch_job_status(job_id):
+    """Progression d'un lot: lignes traitées / total, débit"""
+    job = get_batch_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Lot introuvable'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/batch-jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_batch_job(job_id):
+    """Relance à partir de son dernier point de contrôle un lot en échec, ou 'running' dont le
+    worker a été tué (aucun battement de coeur depuis BATCH_HEARTBEAT_TIMEOUT secondes)"""
+    job = get_batch_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Lot introuvable'}), 404
+    resumable = job.status == 'failed' or job.is_stale(app.config['BATCH_HEARTBEAT_TIMEOUT'])
+    if not resumable or not job.input_path or not os.path.exists(job.input_path):
+        return jsonify({'success': False, 'message': 'Seul un lot en échec ou interrompu peut être relancé'}), 409
+    
+    process_batch_job.delay(job_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/batch-rejects/<job_id>')
+@login_required
+def batch_rejects(job_id):
+    """Fichier des lignes rejetées d'un lot (valeurs d'origine + motif)"""
+    job = get_batch_job(job_id)
+    if job is None or not job.reject_path or not os.path.exists(job.reject_path):
+        flash(_('no_batch_job'), 'error')
+        return redirect(url_for('batch_prediction'))
+    return send_file(os.path.abspath(job.reject_path), mimetype='text/csv', as_attachment=True,
+                     download_name=f'rejets_lot_{job_id}.csv')
+
 @app.route('/batch-results')
 @login_required
 def batch_results():
-    """Page des résultats d'analyse par lots"""
-    # Cette route devrait être appelée après le traitement par lots
-    # Pour l'instant, on simule des résultats
-    results = [
-        {
-            'transaction_id': i + 1,
-            'amount': round(np.random.uniform(10, 1000), 2),
-            'prediction': 'Fraude' if np.random.random() < 0.15 else 'Sécurisé',
-            'confidence': round(np.random.uniform(0.7, 0.99), 3)
-        }
-        for i in range(10)
-    ]
+    """Page des résultats d'analyse par lots: dernier lot de l'utilisateur"""
+    job = BatchJob.query.filter_by(user_id=current_user.id).order_by(BatchJob.created_at.desc()).first()
+    if job is None:
+        flash(_('no_batch_job'), 'info')
+        return redirect(url_for('batch_prediction'))
+    return redirect(url_for('batch_results_job', job_id=job.id))
+
+@app.route('/batch-results/<job_id>')
+@login_required
+def batch_results_job(job_id):
+    """Résultats paginés d'un lot, lus par tranche dans le stockage colonnaire"""
+    job = get_batch_job(job_id)
+    if job is None:
+        flash(_('no_batch_job'), 'error')
+        return redirect(url_for('batch_prediction'))
+    
+    page_size = app.config['BATCH_PAGE_ROWS']
+    page = max(1, request.args.get('page', 1, type=int))
+    results, total_pages = [], 0
+    if job.result_path and os.path.exists(job.result_path):
+        store = ColumnarStore(job.result_path)
+        total_pages = (len(store) + page_size - 1) // page_size
+        results = result_records(store.read((page - 1) * page_size, page * page_size))
     
-    return render_template('batch_results.html', results=results)
+    return render_template('batch_results.html',
+                         job=job,
+                         results=results,
+                         page=page,
+                         total_pages=total_pages)
 
 @app.route('/analysis')
 @login_required
@@ -1283,17 +1907,38 @@ def reports():
 @app.route('/export-results/<format_type>')
 @login_required
 def export_results(format_type):
-    """Exporter les résultats d'analyse"""
+    """Exporter les résultats d'analyse en flux (CSV ou NDJSON), ou un lot en Parquet
+
+    ?job_id=... exporte un lot stocké ; sans job_id, l'historique des prédictions de l'utilisateur.
+    """
     try:
-        # Récupérer les résultats de la session ou les regénérer
-        # Pour l'instant, on simule l'export
-        if format_type == 'csv':
-            flash(_('report_generated'), 'success')
-            # Retourner un fichier CSV simulé
-            return "ID,Montant,Prédiction,Confiance\n1,100.50,Sécurisé,85.2%", 200, {
-                'Content-Type': 'text/csv',
-                'Content-Disposition': 'attachment; filename=resultats_analyse.csv'
-            }
+        if format_type == 'parquet' and request.args.get('job_id'):
+            job_id = request.args.get('job_id')
+            job = get_batch_job(job_id)
+            if job is None or job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+                flash(_('no_batch_job'), 'error')
+                return redirect(url_for('batch_prediction'))
+            path = export_batch_parquet(ColumnarStore(job.result_path), f'{job.result_path}.parquet')
+            return send_file(os.path.abspath(path), mimetype='application/vnd.apache.parquet', as_attachment=True,
+                             download_name=f'resultats_lot_{job_id}.parquet')
+        elif format_type in EXPORT_FORMATS:
+            job_id = request.args.get('job_id')
+            if job_id:
+                job = get_batch_job(job_id)
+                if job is None or not job.result_path or not os.path.exists(job.result_path):
+                    flash(_('no_batch_job'), 'error')
+                    return redirect(url_for('batch_prediction'))
+                rows = export_batch_results(ColumnarStore(job.result_path), format_type)
+                filename = f'resultats_lot_{job_id}.{format_type}'
+            else:
+                query = PredictionHistory.query.filter_by(user_id=current_user.id).order_by(PredictionHistory.id)
+                rows = export_prediction_history(query, format_type)
+                filename = f'historique_predictions.{format_type}'
+            
+            # Réponse générée au fil de l'eau : premier octet immédiat, mémoire constante
+            return app.response_class(stream_with_context(rows), mimetype=EXPORT_FORMATS[format_type], headers={
+                'Content-Disposition': f'attachment; filename={filename}'
+            })
         elif format_type == 'pdf':
             flash(_('report_generated'), 'success')
         else:
@@ -1347,7 +1992,20 @@ def train_model():
 # Initialisation de la base de données
 def init_db():
     with app.app_context():
-        db.create_all()
+        # Base créée par db.create_all() avant l'introduction des migrations : marquée à la
+        # révision correspondant à son schéma pour que upgrade() n'applique que les suivantes
+        inspector = db.inspect(db.engine)
+        if inspector.has_table('prediction_history') and not inspector.has_table('alembic_version'):
+            columns = {column['name'] for column in inspector.get_columns('prediction_history')}
+            if inspector.has_table('batch_job'):
+                revision = '0003'
+            elif 'model_version' in columns:
+                revision = '0002'
+            else:
+                revision = '0001'
+            stamp(revision=revision)
+            logger.info(f"Base existante marquée à la révision {revision} des migrations")
+        upgrade()
         
         admin = User.query.filter_by(is_admin=True).first()
         if not admin:
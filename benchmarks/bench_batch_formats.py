@@ -0,0 +1,166 @@
+"""Lecture des lots CSV, Parquet et Arrow IPC (services/batch_processor.py)
+
+Usage, depuis la racine du dépôt :
+    python -m benchmarks.bench_batch_formats --rows 500000 --extra-columns 0,30
+
+Génère un fichier de --rows transactions (lignes de data/creditcarddata.csv, bruit
+gaussien sur les colonnes réelles, 300 lignes invalides) avec, en plus des 13 colonnes
+du modèle, 0 ou N colonnes aléatoires que le schéma ne référence pas. Chaque fichier
+est écrit en CSV, Parquet et Arrow IPC, puis lu par morceaux et validé comme dans un
+lot (iter_chunks + BatchSchema.validate, sans scoring). Chaque mesure tourne dans un
+processus neuf : le pic de mémoire (VmHWM) est mesuré après les imports puis en fin
+de lecture ; la colonne « lecture » est l'écart entre les deux.
+"""
+import argparse
+import json
+import numpy as np
+import os
+import pandas as pd
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import ROOT, load_training_data, machine_info
+from model.scoring_engine import FEATURE_COLUMNS
+from services.batch_schema import FEATURE_SPECS
+
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+INVALID_ROWS = 300
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant (Mo)"""
+    # Sous Linux, ru_maxrss survit au fork + exec et inclut le pic du parent : VmHWM ne compte que ce processus
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def batch_frame(rows, extra_columns, seed=0):
+    """Transactions réalistes : colonnes entières recopiées, colonnes réelles bruitées, extra_columns aléatoires"""
+    X, _ = load_training_data()
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(X[rng.integers(0, len(X), rows)], columns=FEATURE_COLUMNS)
+    for column, (dtype, low, high) in FEATURE_SPECS.items():
+        if dtype == 'float32':
+            df[column] += rng.normal(0, 0.1 * X[:, FEATURE_COLUMNS.index(column)].std(), rows)
+            if low is not None:
+                df[column] = df[column].clip(lower=low)
+        else:
+            df[column] = df[column].astype(np.int64)
+    df.loc[rng.choice(rows, INVALID_ROWS, replace=False), 'TransactionHour'] = 31
+    for index in range(extra_columns):
+        df[f'extra_{index}'] = rng.normal(size=rows)
+    return df
+
+
+def write_files(df, directory, formats):
+    """Écrit df dans chaque format ; retourne {format: chemin}"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    paths = {}
+    for name in formats:
+        path = os.path.join(directory, f'batch_{len(df.columns)}{FORMATS[name]}')
+        if name == 'csv':
+            df.to_csv(path, index=False)
+        elif name == 'parquet':
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=65536)
+        paths[name] = path
+    return paths
+
+
+def measure(path, chunk_rows):
+    """Lecture + validation de tout le fichier dans le processus courant (appelé par --measure)"""
+    from services.batch_processor import BatchProcessor
+    from services.batch_schema import BatchSchema
+
+    import_rss = peak_rss_mb()
+    with tempfile.TemporaryDirectory(prefix='bench_formats_') as upload_dir:
+        processor = BatchProcessor(None, upload_dir=upload_dir, chunk_size=chunk_rows)
+        start = time.perf_counter()
+        schema = BatchSchema.from_header(processor.read_header(path))
+        rows = rejected = 0
+        for chunk, _ in processor.iter_chunks(path, schema.columns):
+            features, valid, reasons = schema.validate(chunk)
+            rows += len(chunk)
+            rejected += len(chunk) - len(features)
+        seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'rows': rows, 'rejected': rejected, 'import_rss_mb': import_rss, 'peak_rss_mb': peak_rss_mb()}
+
+
+def measure_in_subprocess(path, chunk_rows):
+    process = subprocess.run([sys.executable, '-m', 'benchmarks.bench_batch_formats', '--measure', path,
+                              '--chunk-rows', str(chunk_rows)], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run(rows, extra_columns_list, formats, chunk_rows, repeat):
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_formats_') as directory:
+        for extra_columns in extra_columns_list:
+            paths = write_files(batch_frame(rows, extra_columns), directory, formats)
+            for name, path in paths.items():
+                runs = [measure_in_subprocess(path, chunk_rows) for _ in range(repeat)]
+                if any(run['rows'] != rows or run['rejected'] != INVALID_ROWS for run in runs):
+                    raise RuntimeError(f"{name}: {runs[0]['rows']} lignes, {runs[0]['rejected']} rejets")
+                results.append({
+                    'format': name,
+                    'extra_columns': extra_columns,
+                    'rows': rows,
+                    'file_mb': round(os.path.getsize(path) / 1e6, 1),
+                    'seconds': round(float(np.median([run['seconds'] for run in runs])), 3),
+                    'import_rss_mb': max(run['import_rss_mb'] for run in runs),
+                    'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+                    'read_rss_mb': max(round(run['peak_rss_mb'] - run['import_rss_mb'], 1) for run in runs)
+                })
+                os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--extra-columns', default='0,30', help="colonnes non référencées par le schéma, séparées par des virgules")
+    parser.add_argument('--formats', default='csv,parquet,arrow')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help="lignes par morceau (BATCH_CHUNK_ROWS)")
+    parser.add_argument('--repeat', type=int, default=3, help="mesures par fichier (médiane du temps, maximum de la mémoire)")
+    parser.add_argument('--json', help="écrit aussi machine et résultats dans ce fichier")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.chunk_rows)))
+        return
+
+    machine = machine_info()
+    print(f"Machine: {machine}")
+    results = run(args.rows, [int(value) for value in args.extra_columns.split(',')],
+                  args.formats.split(','), args.chunk_rows, args.repeat)
+
+    print(f"\n{args.rows} lignes ({INVALID_ROWS} invalides), lecture + validation par morceaux de {args.chunk_rows}, "
+          f"médiane de {args.repeat} processus")
+    print(f"{'colonnes':>8} {'format':<8} {'taille Mo':>10} {'durée s':>8} {'lignes/s':>11} {'RSS imports Mo':>15} {'pic RSS Mo':>11} {'lecture Mo':>11}")
+    for result in results:
+        print(f"{13 + result['extra_columns']:>8} {result['format']:<8} {result['file_mb']:>10.1f} {result['seconds']:>8.3f} "
+              f"{round(result['rows'] / result['seconds']):>11,} {result['import_rss_mb']:>15.1f} {result['peak_rss_mb']:>11.1f} {result['read_rss_mb']:>11.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'machine': machine, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
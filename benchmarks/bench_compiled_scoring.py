@@ -0,0 +1,83 @@
+"""predict_proba natif contre ensemble compilé en tableaux NumPy (model/tree_compiler.py)
+
+Usage, depuis la racine du dépôt :
+    python -m benchmarks.bench_compiled_scoring --models rf,gb,xgb --sizes 1,16,100,100000
+
+Entraîne chaque ensemble de train_model.py (mêmes hyperparamètres) sur
+data/creditcarddata.csv, le compile avec compile_ensemble, puis mesure la latence
+par appel (p50 et p99) des deux prédicteurs pour chaque taille de lot, sur les mêmes
+lignes normalisées. L'écart maximal entre les deux probabilités est vérifié sur le
+plus grand lot (check_parity, tolérance 1e-6).
+"""
+import argparse
+import json
+import numpy as np
+
+from benchmarks.common import load_training_data, train, sample_rows, timings, machine_info
+from model.tree_compiler import compile_ensemble, check_parity
+
+MODEL_NAMES = {'rf': 'RandomForest', 'gb': 'GradientBoosting', 'xgb': 'XGBoost'}
+
+
+def repeat_for(size):
+    """Nombre d'appels mesurés : beaucoup pour les petits lots, quelques-uns pour les gros"""
+    return max(3, min(300, 300000 // max(size, 1)))
+
+
+def run(models, sizes):
+    X_train, y_train = load_training_data()
+    X = sample_rows(X_train, max(sizes))
+    results = []
+    for kind in models:
+        try:
+            model, scaler = train(kind, X_train, y_train)
+        except ImportError as e:
+            print(f"{MODEL_NAMES[kind]} ignoré: {str(e)}")
+            continue
+        forest = compile_ensemble(model)
+        X_scaled = scaler.transform(X)
+        max_diff, ok = check_parity(model, forest, X_scaled)
+        for size in sizes:
+            batch = np.ascontiguousarray(X_scaled[:size])
+            native = timings(lambda: model.predict_proba(batch), repeat_for(size)) * 1000
+            compiled = timings(lambda: forest.predict_proba(batch), repeat_for(size)) * 1000
+            results.append({
+                'model': MODEL_NAMES[kind],
+                'rows': size,
+                'calls': len(native),
+                'native_p50_ms': round(float(np.percentile(native, 50)), 4),
+                'native_p99_ms': round(float(np.percentile(native, 99)), 4),
+                'compiled_p50_ms': round(float(np.percentile(compiled, 50)), 4),
+                'compiled_p99_ms': round(float(np.percentile(compiled, 99)), 4),
+                'max_abs_diff': max_diff,
+                'parity': ok
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', default='rf,gb,xgb')
+    parser.add_argument('--sizes', default='1,16,100,100000')
+    parser.add_argument('--json', help="écrit aussi machine et résultats dans ce fichier")
+    args = parser.parse_args()
+
+    machine = machine_info()
+    print(f"Machine: {machine}")
+    results = run(args.models.split(','), [int(value) for value in args.sizes.split(',')])
+
+    print(f"\n{'modèle':<17} {'lignes':>7} {'appels':>6} {'natif p50':>10} {'natif p99':>10} "
+          f"{'compilé p50':>11} {'compilé p99':>11} {'gain p50':>8}  écart max")
+    for result in results:
+        gain = result['native_p50_ms'] / result['compiled_p50_ms'] if result['compiled_p50_ms'] else float('inf')
+        print(f"{result['model']:<17} {result['rows']:>7} {result['calls']:>6} {result['native_p50_ms']:>10.3f} "
+              f"{result['native_p99_ms']:>10.3f} {result['compiled_p50_ms']:>11.3f} {result['compiled_p99_ms']:>11.3f} "
+              f"{gain:>7.2f}x  {result['max_abs_diff']:.1e}{'' if result['parity'] else '  PARITÉ KO'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'machine': machine, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Débit des retours d'apprentissage : /api/feedback unitaire contre /api/feedback/bulk (app.py)
+
+Usage, depuis la racine du dépôt :
+    python -m benchmarks.bench_feedback --items 5000 --bulk-size 1000
+
+Démarre l'application sur une base SQLite, un registre et un journal des retours
+temporaires (broker Celery en mémoire, tâches exécutées dans le processus : la mise
+à jour du modèle en ligne est comprise dans la mesure), insère --items prédictions
+tirées de data/creditcarddata.csv, puis envoie leurs labels par trois chemins :
+
+- unitaire, batch_size=1 : un appel /api/feedback et un partial_fit par retour
+  (comportement d'avant la mise en tampon) ;
+- unitaire, mini-lots : un appel /api/feedback par retour, appliqués par
+  ONLINE_BATCH_SIZE retours ;
+- groupé : /api/feedback/bulk par appels de --bulk-size retours, une tâche
+  update_model_bulk par appel.
+
+Chaque mesure se termine par un flush() de l'apprenant : tous les retours envoyés
+ont été appris. Le nombre de lignes apprises est vérifié sur le compteur t_ du SGD.
+"""
+import argparse
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.common import ROOT, load_training_data, machine_info
+
+
+def start_app(directory):
+    """Importe app.py avec une configuration isolée dans directory ; retourne (module, client connecté)"""
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        'CELERY_BROKER_URL': 'memory://',
+        'CELERY_RESULT_BACKEND': 'cache+memory://',
+        'MODEL_REGISTRY_PATH': os.path.join(directory, 'registry'),
+        'ONLINE_SNAPSHOT_PATH': os.path.join(directory, 'registry', 'online_weights.f64'),
+        'FEEDBACK_LOG_PATH': os.path.join(directory, 'registry', 'feedback.log'),
+        'UPLOAD_FOLDER': os.path.join(directory, 'uploads'),
+        'SHADOW_ENABLED': 'False',
+        'DRIFT_ENABLED': 'False'
+    })
+    os.chdir(ROOT)
+    import app as application
+    application.app.config['TESTING'] = True
+    application.celery.conf.CELERY_ALWAYS_EAGER = True
+    application.init_db()
+    client = application.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return application, client
+
+
+def insert_predictions(application, items, seed=0):
+    """items prédictions de l'administrateur (features réelles) ; retourne [(prediction_id, label)]"""
+    X, y = load_training_data()
+    rows = np.random.default_rng(seed).integers(0, len(X), items)
+    with application.app.app_context():
+        admin = application.User.query.filter_by(is_admin=True).first()
+        application.db.session.execute(application.db.insert(application.PredictionHistory), [
+            {
+                'user_id': admin.id,
+                'transaction_data': json.dumps({f'feature_{i}': float(value) for i, value in enumerate(X[row], start=1)}),
+                'prediction': 'Non Fraude',
+                'confidence': 0.5,
+                'amount': float(X[row, 0])
+            }
+            for row in rows
+        ])
+        application.db.session.commit()
+        ids = [prediction_id for (prediction_id,) in application.db.session.query(application.PredictionHistory.id)
+               .order_by(application.PredictionHistory.id.desc()).limit(items)]
+    return list(zip(sorted(ids), (int(label) for label in y[rows])))
+
+
+def send_single(client, feedback):
+    for prediction_id, label in feedback:
+        response = client.post('/api/feedback', json={'prediction_id': prediction_id, 'is_correct': True,
+                                                      'actual_label': label})
+        if not response.get_json()['success']:
+            raise RuntimeError(f"/api/feedback: {response.get_json()}")
+
+
+def send_bulk(client, feedback, bulk_size):
+    for start in range(0, len(feedback), bulk_size):
+        items = [{'prediction_id': prediction_id, 'actual_label': label}
+                 for prediction_id, label in feedback[start:start + bulk_size]]
+        result = client.post('/api/feedback/bulk', json={'feedback': items}).get_json()
+        if not result['success'] or result['queued'] != len(items):
+            raise RuntimeError(f"/api/feedback/bulk: {result}")
+
+
+def measure(application, send, batch_size, items):
+    """Envoie tous les retours puis applique le reste du tampon ; retourne (secondes, lignes apprises)"""
+    learner = application.online_learner
+    learner.batch_size = batch_size
+    learned = learner.model.t_
+    start = time.perf_counter()
+    send()
+    learner.flush()
+    seconds = time.perf_counter() - start
+    return seconds, int(round(learner.model.t_ - learned))
+
+
+def run(items, bulk_size):
+    directory = tempfile.mkdtemp(prefix='bench_feedback_')
+    try:
+        application, client = start_app(directory)
+        batch_size = application.app.config['ONLINE_BATCH_SIZE']
+        feedback = insert_predictions(application, items)
+        # Chauffe : le premier retour fait de ce processus l'écrivain (démarrage à chaud du modèle en ligne)
+        send_single(client, feedback[:1])
+        application.online_learner.flush()
+
+        modes = [
+            ('unitaire, batch_size=1', lambda: send_single(client, feedback), 1),
+            (f'unitaire, mini-lots de {batch_size}', lambda: send_single(client, feedback), batch_size),
+            (f'groupé, {bulk_size} par appel', lambda: send_bulk(client, feedback, bulk_size), batch_size)
+        ]
+        results = []
+        for name, send, mode_batch_size in modes:
+            seconds, learned = measure(application, send, mode_batch_size, items)
+            if learned != items:
+                raise RuntimeError(f"{name}: {learned} lignes apprises pour {items} retours")
+            results.append({
+                'mode': name,
+                'items': items,
+                'seconds': round(seconds, 3),
+                'items_per_second': round(items / seconds),
+                'ms_per_item': round(seconds / items * 1000, 4)
+            })
+        application.online_learner.close()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--bulk-size', type=int, default=1000, help="retours par appel à /api/feedback/bulk")
+    parser.add_argument('--json', help="écrit aussi machine et résultats dans ce fichier")
+    args = parser.parse_args()
+
+    machine = machine_info()
+    print(f"Machine: {machine}")
+    results = run(args.items, args.bulk_size)
+
+    print(f"\n{args.items} retours, client de test Flask + SQLite, tâches Celery exécutées dans le processus")
+    print(f"{'chemin':<32} {'durée s':>8} {'retours/s':>10} {'ms/retour':>10}")
+    for result in results:
+        print(f"{result['mode']:<32} {result['seconds']:>8.3f} {result['items_per_second']:>10,} {result['ms_per_item']:>10.4f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'machine': machine, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Passage à l'échelle du scoring par lots multi-processus (services/parallel_scorer.py)
+
+Usage, depuis la racine du dépôt :
+    python -m benchmarks.bench_parallel_scoring --rows 2000000 --workers 1,2,4,8
+
+Entraîne la forêt aléatoire de train_model.py (100 arbres, random_state=42) sur
+data/creditcarddata.csv, la charge dans un ScoringEngine, puis score la même matrice
+de --rows lignes avec ParallelScorer pour chaque nombre de workers (1 = scoring
+séquentiel du moteur, la référence). Le démarrage du pool est mesuré à part.
+Les nombres de workers supérieurs au nombre de coeurs utilisables ne mesurent que
+le surcoût du pool : le résultat les signale.
+"""
+import argparse
+import joblib
+import json
+import numpy as np
+import os
+import tempfile
+import time
+
+from benchmarks.common import load_training_data, train, sample_rows, timings, machine_info
+from model.scoring_engine import ScoringEngine
+from services.parallel_scorer import ParallelScorer
+
+
+def run(rows, workers_list, repeat, capacity):
+    X_train, y_train = load_training_data()
+    model, scaler = train('rf', X_train, y_train)
+    X = sample_rows(X_train, rows)
+    usable = machine_info()['usable_cpus']
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_parallel_') as model_dir:
+        joblib.dump(model, os.path.join(model_dir, 'best_model.pkl'))
+        joblib.dump(scaler, os.path.join(model_dir, 'scaler.pkl'))
+        engine = ScoringEngine(model_dir, compiled_max_rows=0)
+        reference = engine.score(X)
+
+        for workers in workers_list:
+            start = time.perf_counter()
+            with ParallelScorer(engine, workers=workers, capacity=capacity) as scorer:
+                startup = time.perf_counter() - start
+                probabilities = scorer.score(X)
+                durations = timings(lambda: scorer.score(X), repeat)
+                parallel = scorer.parallel
+            results.append({
+                'workers': workers,
+                'parallel': parallel,
+                'oversubscribed': workers > usable,
+                'pool_startup_seconds': round(startup, 4),
+                'seconds': round(float(np.median(durations)), 4),
+                'rows_per_second': round(rows / float(np.median(durations))),
+                'max_abs_diff': float(np.max(np.abs(probabilities - reference)))
+            })
+
+    baseline = results[0]['seconds'] if results and results[0]['workers'] == 1 else None
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2) if baseline else None
+        result['efficiency'] = round(result['speedup'] / result['workers'], 2) if baseline else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--workers', default=None,
+                        help="nombres de workers séparés par des virgules (défaut: 1, 2, 4, ... jusqu'aux coeurs utilisables)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=50000, help="lignes par passe en mémoire partagée (BATCH_CHUNK_ROWS)")
+    parser.add_argument('--json', help="écrit aussi machine et résultats dans ce fichier")
+    args = parser.parse_args()
+
+    machine = machine_info()
+    if args.workers:
+        workers_list = [int(value) for value in args.workers.split(',')]
+    else:
+        workers_list = [1]
+        while workers_list[-1] * 2 <= max(2, machine['usable_cpus']):
+            workers_list.append(workers_list[-1] * 2)
+        if workers_list[-1] != machine['usable_cpus'] and machine['usable_cpus'] > 2:
+            workers_list.append(machine['usable_cpus'])
+    if 1 not in workers_list:
+        workers_list.insert(0, 1)
+
+    print(f"Machine: {machine}")
+    if machine['usable_cpus'] < max(workers_list):
+        print(f"Attention: {machine['usable_cpus']} coeur(s) utilisable(s) ; au-delà, "
+              f"les mesures ne reflètent que le surcoût du pool, pas le passage à l'échelle")
+    results = run(args.rows, workers_list, args.repeat, args.capacity)
+
+    print(f"\n{args.rows} lignes, forêt aléatoire 100 arbres, médiane de {args.repeat} passes")
+    print(f"{'workers':>7} {'pool':>5} {'démarrage s':>11} {'durée s':>9} {'lignes/s':>11} {'accél.':>7} {'effic.':>7}  écart max")
+    for result in results:
+        print(f"{result['workers']:>7} {'oui' if result['parallel'] else 'non':>5} {result['pool_startup_seconds']:>11.3f} "
+              f"{result['seconds']:>9.3f} {result['rows_per_second']:>11,} {result['speedup']:>7} {result['efficiency']:>7}  "
+              f"{result['max_abs_diff']:.1e}{'  (sur-souscrit)' if result['oversubscribed'] else ''}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'machine': machine, 'rows': args.rows, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
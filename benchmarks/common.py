@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import os
+import platform
+import sklearn
+import time
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+from model.scoring_engine import FEATURE_COLUMNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAINING_DATA = os.path.join(ROOT, 'data', 'creditcarddata.csv')
+
+
+def load_training_data():
+    """Features (float64) et labels du jeu d'entraînement du dépôt"""
+    data = pd.read_csv(TRAINING_DATA).dropna()
+    return data[FEATURE_COLUMNS].to_numpy(dtype=np.float64), data['PotentialFraud'].to_numpy(dtype=np.int64)
+
+
+def train(kind, X, y):
+    """Modèle de train_model.py (mêmes hyperparamètres) entraîné sur X normalisé ; retourne (modèle, scaler)"""
+    scaler = StandardScaler().fit(X)
+    if kind == 'rf':
+        model = RandomForestClassifier(n_estimators=100, random_state=42)
+    elif kind == 'gb':
+        model = GradientBoostingClassifier(random_state=42)
+    elif kind == 'xgb':
+        from xgboost import XGBClassifier
+        model = XGBClassifier(random_state=42, eval_metric='logloss')
+    else:
+        raise ValueError(f"Modèle inconnu: {kind}")
+    return model.fit(scaler.transform(X), y), scaler
+
+
+def sample_rows(X, n, seed=0):
+    """n lignes tirées du jeu d'entraînement avec un bruit gaussien (10 % de l'écart-type de chaque colonne)"""
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n)]
+    return np.ascontiguousarray(rows + rng.normal(0, 0.1, rows.shape) * X.std(axis=0))
+
+
+def timings(fn, repeat):
+    """Durées (secondes) de repeat appels à fn, après un appel de chauffe"""
+    fn()
+    durations = np.empty(repeat)
+    for index in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations[index] = time.perf_counter() - start
+    return durations
+
+
+def machine_info():
+    """Description de la machine de mesure (à joindre à tout résultat publié)"""
+    usable = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return {
+        'cpu_count': os.cpu_count(),
+        'usable_cpus': usable,
+        'processor': platform.processor() or platform.machine(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__
+    }
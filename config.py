@@ -33,7 +33,23 @@ class Config:
     
     # Configuration Upload
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 2 * 1024 * 1024 * 1024))  # 2 Go max
+    BATCH_CHUNK_ROWS = int(os.environ.get('BATCH_CHUNK_ROWS', 50000))  # lignes scorées par morceau
+    BATCH_PAGE_ROWS = int(os.environ.get('BATCH_PAGE_ROWS', 100))  # lignes par page de résultats
+    BATCH_DEDUPE = os.environ.get('BATCH_DEDUPE', 'True').lower() == 'true'  # lignes identiques scorées une seule fois
+    # Processus de scoring par lot (0 = nombre de coeurs, 1 = séquentiel) ; nécessite un worker non daemon (-P solo / threads)
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0))
+    # Retours d'apprentissage : file 'learner' consommée par un seul worker (concurrence 1), seul écrivain du modèle en ligne
+    CELERY_ROUTES = {
+        'app.process_batch_job': {'queue': 'batch'},
+        'app.update_model_async': {'queue': 'learner'},
+        'app.update_model_bulk': {'queue': 'learner'},
+        'app.rebuild_online_model': {'queue': 'learner'}
+    }
+    # Les lots sont acquittés en fin de tâche (acks_late) : le délai de redistribution Redis doit dépasser le plus long lot
+    BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': int(os.environ.get('BATCH_VISIBILITY_TIMEOUT', 12 * 3600))}
+    # Lot 'running' sans battement de coeur (point de contrôle) depuis N secondes : worker considéré mort, lot relançable
+    BATCH_HEARTBEAT_TIMEOUT = int(os.environ.get('BATCH_HEARTBEAT_TIMEOUT', 600))
     
     # Langues supportées
     LANGUAGES = ['fr', 'en']
@@ -53,6 +69,54 @@ class Config:
     # Configuration Modèle ML
     MODEL_PATH = os.environ.get('MODEL_PATH', 'model/')
     TRAINING_DATA_PATH = os.environ.get('TRAINING_DATA_PATH', 'data/')
+    SCORING_THRESHOLD = float(os.environ.get('SCORING_THRESHOLD', 0.5))
+    SCORING_COMPILED_MAX_ROWS = int(os.environ.get('SCORING_COMPILED_MAX_ROWS', 16))  # 0 = désactivé
+    MODEL_MMAP = os.environ.get('MODEL_MMAP', 'True').lower() == 'true'
+    MODEL_REGISTRY_PATH = os.environ.get('MODEL_REGISTRY_PATH', 'model/registry')
+    MODEL_CHECK_INTERVAL = float(os.environ.get('MODEL_CHECK_INTERVAL', 1.0))  # secondes
+    # Apprentissage en ligne par mini-lots : appliqué dès ONLINE_BATCH_SIZE retours ou après ONLINE_FLUSH_SECONDS
+    # Processus écrivain du modèle en ligne (worker de la file 'learner') : seul à initialiser et publier au démarrage
+    ONLINE_LEARNER_WRITER = os.environ.get('ONLINE_LEARNER_WRITER', 'False').lower() == 'true'
+    ONLINE_BATCH_SIZE = int(os.environ.get('ONLINE_BATCH_SIZE', 100))
+    ONLINE_FLUSH_SECONDS = float(os.environ.get('ONLINE_FLUSH_SECONDS', 30))
+    # Publication du modèle en ligne dans le registre : au plus une toutes les N secondes ou M lignes apprises
+    ONLINE_CHECKPOINT_SECONDS = float(os.environ.get('ONLINE_CHECKPOINT_SECONDS', 10))
+    ONLINE_CHECKPOINT_UPDATES = int(os.environ.get('ONLINE_CHECKPOINT_UPDATES', 1000))
+    # Instantané compact des poids publié par le worker 'learner' (seul écrivain) et relu par les autres processus
+    ONLINE_SNAPSHOT_PATH = os.environ.get('ONLINE_SNAPSHOT_PATH', 'model/registry/online_weights.f64')
+    ONLINE_SNAPSHOT_SECONDS = float(os.environ.get('ONLINE_SNAPSHOT_SECONDS', 1.0))
+    # Journal binaire en ajout seul des retours étiquetés (rejeu / retour arrière du modèle en ligne)
+    FEEDBACK_LOG_PATH = os.environ.get('FEEDBACK_LOG_PATH', 'model/registry/feedback.log')
+    # Nombre maximal de retours par appel à /api/feedback/bulk (une requête IN et un UPDATE par appel)
+    FEEDBACK_BULK_MAX_ITEMS = int(os.environ.get('FEEDBACK_BULK_MAX_ITEMS', 10000))
+    
+    # Shadow scoring champion/challenger (versions séparées par des virgules, vide = challengers du dernier entraînement)
+    SHADOW_ENABLED = os.environ.get('SHADOW_ENABLED', 'False').lower() == 'true'
+    SHADOW_VERSIONS = os.environ.get('SHADOW_VERSIONS', '')
+    SHADOW_OUTPUT_PATH = os.environ.get('SHADOW_OUTPUT_PATH', 'model/shadow')
+    
+    # Suivi de dérive des features et de la probabilité (référence écrite par model/train_model.py)
+    DRIFT_ENABLED = os.environ.get('DRIFT_ENABLED', 'True').lower() == 'true'
+    DRIFT_REFERENCE_PATH = os.environ.get('DRIFT_REFERENCE_PATH', 'model/registry/drift_reference.json')
+    DRIFT_OUTPUT_PATH = os.environ.get('DRIFT_OUTPUT_PATH', 'model/drift')
+    DRIFT_FLUSH_SECONDS = float(os.environ.get('DRIFT_FLUSH_SECONDS', 10.0))
+    
+    # Scoring en cascade : pré-filtre linéaire, modèle actif seulement si low <= proba <= high
+    SCORING_CASCADE_ENABLED = os.environ.get('SCORING_CASCADE_ENABLED', 'False').lower() == 'true'
+    SCORING_CASCADE_BAND = os.environ.get('SCORING_CASCADE_BAND', '0.05,0.95')
+    
+    # Budget de latence par requête (ms, 0 = sans limite) ; au-delà, score de repli marqué comme dégradé
+    SCORING_DEADLINE_MS = float(os.environ.get('SCORING_DEADLINE_MS', 0))
+    SCORING_DEADLINE_WORKERS = int(os.environ.get('SCORING_DEADLINE_WORKERS', 4))
+    
+    # Micro-lots de scoring : à activer seulement avec des workers multi-threads (gunicorn --threads / gthread) ;
+    # avec les workers sync mono-thread du dockerfile rien n'est jamais regroupé et chaque requête paie un passage de thread
+    SCORING_COALESCE_ENABLED = os.environ.get('SCORING_COALESCE_ENABLED', 'False').lower() == 'true'
+    SCORING_COALESCE_WAIT_MS = float(os.environ.get('SCORING_COALESCE_WAIT_MS', 2.0))
+    SCORING_COALESCE_MAX_ROWS = int(os.environ.get('SCORING_COALESCE_MAX_ROWS', 64))
+    
+    # API de scoring JSON
+    API_SCORE_MAX_ROWS = int(os.environ.get('API_SCORE_MAX_ROWS', 100000))
     
     # Debug et Testing
     DEBUG = os.environ.get('DEBUG', 'True').lower() == 'true'
@@ -89,6 +153,9 @@ class TestingConfig(Config):
     
     # Email en mode test
     MAIL_SUPPRESS_SEND = True
+    
+    # Petits morceaux : plusieurs points de contrôle sur un fichier de test
+    BATCH_CHUNK_ROWS = 10
 
 
 class ProductionConfig(Config):
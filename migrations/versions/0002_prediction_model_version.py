@@ -0,0 +1,28 @@
+"""Version du modèle et score dégradé de chaque prédiction
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 08:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('prediction_history') as batch_op:
+        batch_op.add_column(sa.Column('model_version', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('is_degraded', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('prediction_history') as batch_op:
+        batch_op.drop_column('is_degraded')
+        batch_op.drop_column('model_version')
@@ -0,0 +1,47 @@
+"""Traitements par lots (BatchJob)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 08:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('batch_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('rows_total', sa.Integer(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=True),
+    sa.Column('frauds', sa.Integer(), nullable=True),
+    sa.Column('rows_rejected', sa.Integer(), nullable=True),
+    sa.Column('duplicates', sa.Integer(), nullable=True),
+    sa.Column('seconds', sa.Float(), nullable=True),
+    sa.Column('seconds_saved', sa.Float(), nullable=True),
+    sa.Column('workers', sa.Integer(), nullable=True),
+    sa.Column('resumes', sa.Integer(), nullable=True),
+    sa.Column('input_path', sa.String(length=500), nullable=True),
+    sa.Column('result_path', sa.String(length=500), nullable=True),
+    sa.Column('reject_path', sa.String(length=500), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('batch_job')
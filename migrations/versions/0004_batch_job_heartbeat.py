@@ -0,0 +1,28 @@
+"""Battement de coeur et exécution propriétaire des lots
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('batch_job') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('run_id', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('batch_job') as batch_op:
+        batch_op.drop_column('run_id')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,64 @@
+import numpy as np
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeScorer:
+    """Scoring en cascade : pré-filtre linéaire rapide, modèle lourd sur la bande incertaine.
+
+    Toutes les transactions sont scorées par le modèle rapide ; seules celles dont la
+    probabilité tombe dans [low, high] sont re-scorées par le modèle lourd.
+    """
+
+    def __init__(self, fast_model, fast_scaler=None, low=0.05, high=0.95):
+        self.fast_model = fast_model
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.escalated = 0
+
+        # Modèle linéaire : scaler replié dans les coefficients (un produit scalaire + sigmoid)
+        self.weights = None
+        self.bias = 0.0
+        if hasattr(fast_model, 'coef_') and np.asarray(fast_model.coef_).shape[0] == 1:
+            coef = np.asarray(fast_model.coef_[0], dtype=np.float64)
+            intercept = float(np.ravel(fast_model.intercept_)[0])
+            if fast_scaler is not None and hasattr(fast_scaler, 'mean_'):
+                self.weights = coef / fast_scaler.scale_
+                self.bias = intercept - float(np.dot(fast_scaler.mean_, self.weights))
+            else:
+                self.weights = coef
+                self.bias = intercept
+        self.fast_scaler = fast_scaler
+
+    def fast_score(self, X):
+        """Probabilité de fraude selon le modèle rapide"""
+        if self.weights is not None:
+            decision = X @ self.weights + self.bias
+            return 1.0 / (1.0 + np.exp(-np.clip(decision, -500, 500)))
+        if self.fast_scaler is not None:
+            X = self.fast_scaler.transform(X)
+        return self.fast_model.predict_proba(X)[:, 1]
+
+    def score(self, X, heavy_score):
+        """Score X (features brutes) ; heavy_score(rows) est appelé sur les lignes ambiguës uniquement"""
+        probabilities = self.fast_score(X)
+        ambiguous = np.flatnonzero((probabilities >= self.low) & (probabilities <= self.high))
+        if len(ambiguous):
+            probabilities[ambiguous] = heavy_score(X[ambiguous])
+
+        with self._lock:
+            self.rows += len(X)
+            self.escalated += len(ambiguous)
+        return probabilities
+
+    def get_stats(self):
+        return {
+            'band': [self.low, self.high],
+            'rows': self.rows,
+            'escalated': self.escalated,
+            'escalation_rate': round(self.escalated / self.rows, 4) if self.rows else None
+        }
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from model.process_local import ProcessThread
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundCheckpointer:
+    """Points de contrôle regroupés et écrits en arrière-plan.
+
+    mark_dirty() est appelé après chaque mise à jour et ne fait aucune E/S. Un thread
+    de fond écrit au plus un point de contrôle toutes les interval secondes, ou dès
+    que max_updates mises à jour sont en attente. snapshot() est appelé par ce thread
+    (copie cohérente de l'état, sous le verrou de l'appelant) puis write(état) fait
+    l'écriture, qui doit être atomique (fichier temporaire + rename).
+    flush() écrit immédiatement dans le thread appelant ce qui reste (arrêt du processus).
+    """
+
+    def __init__(self, snapshot, write, interval=10.0, max_updates=100, name='checkpointer'):
+        self.snapshot = snapshot
+        self.write = write
+        self.interval = interval
+        self.max_updates = max_updates
+        self.name = name
+        self._cond = threading.Condition()
+        # Un seul point de contrôle à la fois (thread de fond ou flush d'arrêt)
+        self._write_lock = threading.Lock()
+        # Thread de fond démarré une fois par processus, y compris après un fork prefork/gunicorn
+        self._thread = ProcessThread(self._run, name)
+        self._pending = 0
+        self._dirty_since = None
+        self._n_writes = 0
+        self._n_updates = 0
+        self._last_write_seconds = None
+
+    def mark_dirty(self, updates=1):
+        """Signale des mises à jour non encore écrites"""
+        self._thread.ensure_started()
+        with self._cond:
+            self._pending += updates
+            self._n_updates += updates
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            if self._pending >= self.max_updates:
+                self._cond.notify()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._pending >= self.max_updates:
+                        break
+                    if self._dirty_since is not None:
+                        remaining = self._dirty_since + self.interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+            if not self.flush() and self._pending:
+                # Échec d'écriture : nouvel essai après un intervalle complet
+                time.sleep(self.interval)
+
+    def flush(self):
+        """Écrit un point de contrôle si des mises à jour sont en attente ; retourne True si écrit"""
+        with self._write_lock:
+            with self._cond:
+                if not self._pending:
+                    return False
+                pending = self._pending
+                self._pending = 0
+                self._dirty_since = None
+            start = time.perf_counter()
+            try:
+                self.write(self.snapshot())
+            except Exception as e:
+                # Les mises à jour restent en attente : le prochain point de contrôle les inclura
+                with self._cond:
+                    self._pending += pending
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                logger.error(f"Erreur point de contrôle ({self.name}): {str(e)}")
+                return False
+            self._n_writes += 1
+            self._last_write_seconds = time.perf_counter() - start
+            return True
+
+    def get_stats(self):
+        return {
+            'updates': self._n_updates,
+            'writes': self._n_writes,
+            'pending': self._pending,
+            'last_write_seconds': round(self._last_write_seconds, 4) if self._last_write_seconds is not None else None
+        }
@@ -0,0 +1,208 @@
+import numpy as np
+import logging
+import os
+import threading
+import time
+from model.drift_reference import PSI_WARNING, PSI_ALERT, load_reference, merge_moments, psi, binned_ks
+from model.process_local import ProcessThread, write_process_summary, read_process_summaries
+
+logger = logging.getLogger(__name__)
+
+
+class DriftMonitor:
+    """Statistiques de dérive des features et de la probabilité sur le chemin de scoring.
+
+    Observateur du moteur de scoring : observe() ne fait qu'ajouter les tableaux du
+    lot à une liste (aucun calcul, aucune E/S). Un thread de fond les agrège toutes les
+    flush_interval secondes en opérations vectorisées dans des tableaux compacts par
+    worker (effectif, moyenne et M2 de Welford/Chan, min/max et histogramme aux classes
+    de la référence, 13 features + probabilité) puis écrit <output_dir>/summary.<pid>.json.
+    merged_report() fusionne les résumés de tous les workers et calcule PSI et KS
+    contre l'instantané de référence écrit par train_model.py. La probabilité n'est
+    comparée que si le modèle actif est issu de l'entraînement (source 'training') :
+    la référence est la distribution des probabilités de ce modèle, pas celle d'un
+    modèle en ligne ou d'un challenger.
+    """
+
+    def __init__(self, reference_path, output_dir='model/drift', flush_interval=10.0, max_pending_rows=200000):
+        self.reference_path = reference_path
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self.reference, self.edges = load_reference(reference_path)
+        self._lock = threading.Lock()
+        # Une seule agrégation à la fois (thread de fond ou flush explicite)
+        self._flush_lock = threading.Lock()
+        self._thread = ProcessThread(self._run, 'drift-monitor', on_start=self._reset_process)
+        self._pending = []
+        self._pending_rows = 0
+        self.dropped = 0
+        self.model_version = None
+        self.model_source = None
+        self._reset_stats()
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.reference is None:
+            logger.warning(f"Référence de dérive absente ({reference_path}) : suivi de dérive désactivé")
+
+    def _reset_stats(self):
+        n_columns, n_bins = (self.edges.shape[0], self.edges.shape[1] + 1) if self.edges is not None else (0, 1)
+        self.count = 0
+        self.invalid = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.minimum = np.full(n_columns, np.inf)
+        self.maximum = np.full(n_columns, -np.inf)
+        self.hist = np.zeros((n_columns, n_bins), dtype=np.int64)
+        self.started_at = time.time()
+
+    def _reset_process(self):
+        """Après un fork, les statistiques héritées du parent ne sont pas celles de ce worker"""
+        self._pending, self._pending_rows = [], 0
+        self._reset_stats()
+
+    def observe(self, X, probabilities, model_version=None, model_source=None):
+        """Dépose un lot scoré ; abandonne le lot si trop de lignes sont en attente"""
+        if self.edges is None:
+            return
+        self._thread.ensure_started()
+        with self._lock:
+            if self._pending_rows + len(X) > self.max_pending_rows:
+                self.dropped += len(X)
+                return
+            self._pending.append((X, probabilities, model_version, model_source))
+            self._pending_rows += len(X)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erreur suivi de dérive: {str(e)}")
+
+    def flush(self):
+        """Agrège les lots en attente et écrit le résumé de ce processus"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._pending_rows = self._pending, [], 0
+            if not pending:
+                return False
+
+            start = 0
+            for end in range(1, len(pending) + 1):
+                # Nouvelle version du modèle : la distribution des probabilités n'est plus comparable
+                if end == len(pending) or pending[end][2] != pending[start][2]:
+                    if pending[start][2] != self.model_version:
+                        self.model_version, self.model_source = pending[start][2], pending[start][3]
+                        self._reset_stats()
+                    batch = pending[start:end]
+                    self._accumulate(np.vstack([X for X, _, _, _ in batch]),
+                                     np.concatenate([probabilities for _, probabilities, _, _ in batch]))
+                    start = end
+            self._write_summary()
+            return True
+
+    def _accumulate(self, X, probabilities):
+        """Met à jour les statistiques avec un bloc de lignes (n, features) et leurs probabilités"""
+        values = np.column_stack([X, probabilities])
+        if values.shape[1] != self.hist.shape[0]:
+            raise ValueError(f"{values.shape[1] - 1} features reçues, la référence en suit {self.hist.shape[0] - 1}")
+        valid = np.isfinite(values).all(axis=1)
+        if not valid.all():
+            self.invalid += int(np.count_nonzero(~valid))
+            values = values[valid]
+        if not len(values):
+            return
+
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        self.count, self.mean, self.m2 = merge_moments(self.count, self.mean, self.m2,
+                                                       len(values), batch_mean, batch_m2)
+        self.minimum = np.minimum(self.minimum, values.min(axis=0))
+        self.maximum = np.maximum(self.maximum, values.max(axis=0))
+
+        # Un seul bincount pour les 14 colonnes : indice de classe décalé par colonne
+        n_columns, n_bins = self.hist.shape
+        bins = np.empty(values.shape, dtype=np.int64)
+        for index in range(n_columns):
+            bins[:, index] = np.searchsorted(self.edges[index], values[:, index], side='right')
+        bins += np.arange(n_columns) * n_bins
+        self.hist += np.bincount(bins.ravel(), minlength=n_columns * n_bins).reshape(n_columns, n_bins)
+
+    def _write_summary(self):
+        write_process_summary(self.output_dir, {
+            'pid': os.getpid(),
+            'model_version': self.model_version,
+            'model_source': self.model_source,
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'rows': self.count,
+            'invalid_rows': self.invalid,
+            'dropped_rows': self.dropped,
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist(),
+            'min': self.minimum.tolist(),
+            'max': self.maximum.tolist(),
+            'hist': self.hist.tolist()
+        })
+
+    @classmethod
+    def merged_report(cls, reference_path, output_dir='model/drift'):
+        """Fusionne les résumés de tous les workers (version de modèle la plus récente) et compare à la référence"""
+        reference, edges = load_reference(reference_path)
+        if reference is None:
+            return {'reference': None, 'model_version': None, 'rows': 0, 'columns': {}}
+
+        model_version, summaries = read_process_summaries(output_dir, 'model_version')
+        model_source = summaries[0].get('model_source') if summaries else None
+
+        n_columns, n_bins = edges.shape[0], edges.shape[1] + 1
+        count, mean, m2 = 0, np.zeros(n_columns), np.zeros(n_columns)
+        minimum, maximum = np.full(n_columns, np.inf), np.full(n_columns, -np.inf)
+        hist = np.zeros((n_columns, n_bins))
+        invalid = dropped = workers = 0
+        for summary in summaries:
+            # Résumé écrit avec une autre référence (classes différentes) : ignoré
+            if np.shape(summary['hist']) != hist.shape:
+                continue
+            count, mean, m2 = merge_moments(count, mean, m2, summary['rows'],
+                                            np.asarray(summary['mean']), np.asarray(summary['m2']))
+            minimum = np.minimum(minimum, summary['min'])
+            maximum = np.maximum(maximum, summary['max'])
+            hist += np.asarray(summary['hist'])
+            invalid += summary['invalid_rows']
+            dropped += summary['dropped_rows']
+            workers += 1
+
+        columns = {}
+        for index, name in enumerate(reference['columns']):
+            if index == n_columns - 1 and summaries and model_source != 'training':
+                # Probabilités d'un autre modèle que celui de la référence : comparaison sans objet
+                columns[name] = {'skipped': f"modèle actif de source {model_source}, référence du modèle d'entraînement"}
+                continue
+            expected = np.zeros(n_bins)
+            expected[:len(reference['counts'][index])] = reference['counts'][index]
+            score = psi(expected, hist[index]) if count else None
+            columns[name] = {
+                'mean': round(float(mean[index]), 6) if count else None,
+                'std': round(float(np.sqrt(m2[index] / count)), 6) if count else None,
+                'min': float(minimum[index]) if count else None,
+                'max': float(maximum[index]) if count else None,
+                'reference_mean': round(reference['mean'][index], 6),
+                'reference_std': round(reference['std'][index], 6),
+                'psi': round(score, 6) if score is not None else None,
+                'ks': round(binned_ks(expected, hist[index]), 6) if count else None,
+                'status': None if score is None else
+                          'stable' if score < PSI_WARNING else 'warning' if score < PSI_ALERT else 'alert'
+            }
+
+        return {
+            'reference': {'created_at': reference['created_at'], 'rows': reference['rows']},
+            'model_version': model_version,
+            'model_source': model_source,
+            'workers': workers,
+            'rows': count,
+            'invalid_rows': invalid,
+            'dropped_rows': dropped,
+            'columns': columns
+        }
@@ -0,0 +1,97 @@
+import numpy as np
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Seuils usuels du PSI : < 0.1 stable, < 0.25 dérive modérée, au-delà dérive forte
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+
+
+def build_reference(X, probabilities, n_bins=20):
+    """Instantané de référence des distributions d'entraînement.
+
+    Colonnes suivies : les features de X (noms repris d'un DataFrame) puis la probabilité
+    de fraude. Les bornes des classes sont les quantiles de la référence (classes de
+    fréquences proches, bornes dédoublonnées pour les variables discrètes) ; la
+    probabilité utilise des classes fixes sur [0, 1].
+    """
+    names = [str(name) for name in getattr(X, 'columns', [])]
+    X = np.asarray(X, dtype=np.float64)
+    names = (names or [f'feature_{index}' for index in range(1, X.shape[1] + 1)]) + ['probability']
+    probabilities = np.asarray(probabilities, dtype=np.float64).ravel()
+    columns = [X[:, index] for index in range(X.shape[1])] + [probabilities]
+
+    edges, counts, means, stds = [], [], [], []
+    for index, values in enumerate(columns):
+        values = values[np.isfinite(values)]
+        if index < X.shape[1]:
+            cuts = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        else:
+            cuts = np.linspace(0.0, 1.0, n_bins + 1)[1:-1]
+        edges.append(cuts.tolist())
+        counts.append(np.bincount(np.searchsorted(cuts, values, side='right'), minlength=len(cuts) + 1).tolist())
+        means.append(float(values.mean()))
+        stds.append(float(values.std()))
+
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'rows': int(len(X)),
+        'columns': names,
+        'edges': edges,
+        'counts': counts,
+        'mean': means,
+        'std': stds
+    }
+
+
+def save_reference(reference, path):
+    """Écrit l'instantané de référence (remplacement atomique)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(reference, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def load_reference(path):
+    """Charge la référence ; retourne (référence, bornes (colonnes, K) complétées par +inf) ou (None, None)"""
+    try:
+        with open(path) as f:
+            reference = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    width = max(len(cuts) for cuts in reference['edges'])
+    edges = np.full((len(reference['edges']), width), np.inf)
+    for index, cuts in enumerate(reference['edges']):
+        edges[index, :len(cuts)] = cuts
+    return reference, edges
+
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """Fusion de deux (effectif, moyenne, somme des carrés des écarts) (Chan et al.)"""
+    count = count_a + count_b
+    if count == 0:
+        return count, mean_a, m2_a
+    delta = mean_b - mean_a
+    mean = mean_a + delta * (count_b / count)
+    m2 = m2_a + m2_b + delta ** 2 * (count_a * count_b / count)
+    return count, mean, m2
+
+
+def psi(expected, actual, epsilon=1e-4):
+    """Population Stability Index entre deux histogrammes de mêmes classes"""
+    expected = np.maximum(expected / max(expected.sum(), 1), epsilon)
+    actual = np.maximum(actual / max(actual.sum(), 1), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def binned_ks(expected, actual):
+    """Statistique de Kolmogorov-Smirnov calculée sur les fonctions de répartition par classes"""
+    expected = np.cumsum(expected) / max(expected.sum(), 1)
+    actual = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(actual - expected)))
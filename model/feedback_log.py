@@ -0,0 +1,105 @@
+import numpy as np
+import logging
+import os
+import threading
+import time
+from model.scoring_engine import N_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Enregistrement de taille fixe (61 octets, sans alignement) : features, label, horodatage (secondes epoch)
+FEEDBACK_DTYPE = np.dtype([
+    ('features', '<f4', (N_FEATURES,)),
+    ('label', 'i1'),
+    ('timestamp', '<f8')
+])
+
+
+class FeedbackLog:
+    """Journal binaire en ajout seul des retours étiquetés.
+
+    Chaque retour est un enregistrement FEEDBACK_DTYPE écrit en fin de fichier ; le
+    nombre de lignes est la taille du fichier divisée par la taille d'un enregistrement,
+    une fin d'écriture interrompue (enregistrement partiel) est donc ignorée à la lecture
+    puis écrasée par l'ajout suivant. La lecture passe par np.memmap et ne charge que
+    la tranche demandée : le rejeu de millions de lignes se fait par gros lots vectorisés,
+    sans requête SQL ni décodage JSON.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // FEEDBACK_DTYPE.itemsize
+        except OSError:
+            return 0
+
+    def append(self, features, labels, timestamps=None):
+        """Ajoute des retours (features (n, 13), labels (n,)) ; retourne le nombre total de lignes"""
+        features = np.atleast_2d(np.asarray(features, dtype=np.float32))
+        labels = np.asarray(labels).ravel()
+        if len(features) != len(labels):
+            raise ValueError(f"{len(features)} lignes de features pour {len(labels)} labels")
+
+        records = np.empty(len(features), dtype=FEEDBACK_DTYPE)
+        records['features'] = features
+        records['label'] = labels
+        records['timestamp'] = time.time() if timestamps is None else timestamps
+
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                # Écrase un éventuel enregistrement partiel laissé par une écriture interrompue
+                rows = f.tell() // FEEDBACK_DTYPE.itemsize
+                if f.tell() != rows * FEEDBACK_DTYPE.itemsize:
+                    f.truncate(rows * FEEDBACK_DTYPE.itemsize)
+                f.write(records.tobytes())
+                f.flush()
+        return rows + len(records)
+
+    def read(self, start=0, stop=None):
+        """Enregistrements [start, stop) (tableau structuré FEEDBACK_DTYPE, copié hors du memmap)"""
+        rows = len(self)
+        stop = rows if stop is None else min(stop, rows)
+        start = max(0, min(start, stop))
+        if stop == start:
+            return np.empty(0, dtype=FEEDBACK_DTYPE)
+        data = np.memmap(self.path, dtype=FEEDBACK_DTYPE, mode='r', shape=(rows,))
+        records = np.array(data[start:stop])
+        del data
+        return records
+
+    def end_row(self, until):
+        """Nombre de lignes enregistrées jusqu'à l'horodatage until inclus (les horodatages sont croissants)"""
+        rows = len(self)
+        if rows == 0:
+            return 0
+        data = np.memmap(self.path, dtype=FEEDBACK_DTYPE, mode='r', shape=(rows,))
+        end = int(np.searchsorted(data['timestamp'], until, side='right'))
+        del data
+        return end
+
+    def iter_batches(self, batch_size=100000, start=0, until=None):
+        """Parcourt le journal par lots: (features float64 (n, 13), labels int64 (n,))"""
+        stop = len(self) if until is None else self.end_row(until)
+        for offset in range(start, stop, batch_size):
+            records = self.read(offset, min(offset + batch_size, stop))
+            yield records['features'].astype(np.float64), records['label'].astype(np.int64)
+
+    def replay(self, learner, batch_size=100000, start=0, until=None):
+        """Rejoue le journal dans learner.partial_fit par lots ; retourne (lignes, secondes)
+
+        Démarrage à chaud (tout le journal) ou retour arrière (modèle réinitialisé puis
+        rejeu jusqu'à until).
+        """
+        rows, begin = 0, time.perf_counter()
+        for features, labels in self.iter_batches(batch_size, start, until):
+            learner.partial_fit({'features': features, 'labels': labels})
+            rows += len(labels)
+        seconds = time.perf_counter() - begin
+        logger.info(f"Journal des retours rejoué: {rows} lignes en {seconds:.2f}s")
+        return rows, seconds
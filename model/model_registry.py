@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+import joblib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Registre de modèles versionnés avec activation atomique.
+
+    Chaque version est un répertoire immuable model/registry/v000001/ contenant
+    model.pkl, scaler.pkl, meta.json (et éventuellement compiled/). La version
+    active est désignée par le manifeste ACTIVE.json, remplacé par os.replace :
+    un lecteur voit toujours l'ancienne ou la nouvelle version, jamais un état partiel.
+
+    Une version en ligne activée avec live=True suit l'instantané des poids publié par
+    l'apprenant ; activée sans live (retour arrière), elle reste figée.
+    """
+
+    MANIFEST = 'ACTIVE.json'
+
+    def __init__(self, root='model/registry', keep=10):
+        self.root = root
+        self.keep = keep
+        os.makedirs(self.root, exist_ok=True)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, self.MANIFEST)
+
+    def version_path(self, version):
+        return os.path.join(self.root, f'v{version:06d}')
+
+    def versions(self):
+        """Liste triée des versions publiées"""
+        found = []
+        for name in os.listdir(self.root):
+            if name.startswith('v') and name[1:].isdigit():
+                found.append(int(name[1:]))
+        return sorted(found)
+
+    def publish(self, model, scaler, source='training', compiled=None, metadata=None, activate=True, live=False):
+        """Écrit une nouvelle version complète puis l'active ; retourne son numéro"""
+        tmp_dir = os.path.join(self.root, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        try:
+            joblib.dump(model, os.path.join(tmp_dir, 'model.pkl'))
+            joblib.dump(scaler, os.path.join(tmp_dir, 'scaler.pkl'))
+            if compiled is not None:
+                compiled.save(os.path.join(tmp_dir, 'compiled'))
+
+            meta = dict(metadata or {})
+            meta.update({
+                'name': type(model).__name__,
+                'source': source,
+                'created_at': datetime.utcnow().isoformat()
+            })
+
+            # Le rename du répertoire réserve le numéro de version ; on réessaie en cas de concurrence
+            while True:
+                version = (self.versions() or [0])[-1] + 1
+                meta['version'] = version
+                with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                    json.dump(meta, f, indent=2)
+                try:
+                    os.rename(tmp_dir, self.version_path(version))
+                    break
+                except OSError:
+                    if not os.path.exists(self.version_path(version)):
+                        raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Modèle publié: version {version} ({meta['name']}, {source})")
+        if activate:
+            self.activate(version, live=live)
+        self.prune(source)
+        return version
+
+    def activate(self, version, live=False):
+        """Bascule atomiquement la version active"""
+        if not os.path.exists(self.version_path(version)):
+            raise ValueError(f"Version {version} inconnue")
+
+        tmp_path = f'{self.manifest_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version, 'live': live, 'activated_at': datetime.utcnow().isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(f"Version active: {version}{' (live)' if live else ''}")
+
+    def active_manifest(self):
+        """Contenu du manifeste ({'version', 'live', 'activated_at'}), None si aucune version active"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if isinstance(manifest, dict) and 'version' in manifest else None
+
+    def active_version(self):
+        """Numéro de la version active (None si aucune)"""
+        manifest = self.active_manifest()
+        return manifest['version'] if manifest else None
+
+    def manifest_stamp(self):
+        """Empreinte peu coûteuse du manifeste (un seul stat) pour détecter une bascule"""
+        try:
+            stat = os.stat(self.manifest_path)
+            return stat.st_mtime_ns, stat.st_ino
+        except OSError:
+            return None
+
+    def latest_version(self, source=None):
+        """Dernière version publiée (optionnellement pour une source donnée: 'training', 'online')"""
+        for version in reversed(self.versions()):
+            try:
+                if source is None or self.metadata(version).get('source') == source:
+                    return version
+            except (OSError, ValueError):
+                continue
+        return None
+
+    def challenger_versions(self):
+        """Versions 'challenger' issues du même entraînement que la version active"""
+        active = self.active_version()
+        run = self.metadata(active).get('training_run') if active is not None else None
+        challengers = []
+        for version in self.versions():
+            try:
+                meta = self.metadata(version)
+            except (OSError, ValueError):
+                continue
+            if version != active and meta.get('source') == 'challenger' and (run is None or meta.get('training_run') == run):
+                challengers.append(version)
+        return challengers
+
+    def metadata(self, version):
+        with open(os.path.join(self.version_path(version), 'meta.json')) as f:
+            return json.load(f)
+
+    def load(self, version, mmap_mode=None):
+        """Charge (modèle, scaler, métadonnées) d'une version"""
+        path = self.version_path(version)
+        model = joblib.load(os.path.join(path, 'model.pkl'), mmap_mode=mmap_mode)
+        scaler = joblib.load(os.path.join(path, 'scaler.pkl'))
+        return model, scaler, self.metadata(version)
+
+    def import_legacy(self, model_dir='model/'):
+        """Importe best_model.pkl + scaler.pkl comme première version si le registre est vide"""
+        model_path = os.path.join(model_dir, 'best_model.pkl')
+        scaler_path = os.path.join(model_dir, 'scaler.pkl')
+        if self.versions() or not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+            return None
+        try:
+            model, scaler = joblib.load(model_path), joblib.load(scaler_path)
+            return self.publish(model, scaler, source='training', metadata={'imported_from': model_path})
+        except Exception as e:
+            logger.error(f"Erreur import {model_path}: {str(e)}")
+            return None
+
+    def prune(self, source=None):
+        """Supprime les plus anciennes versions au-delà de keep par source (jamais la version active)"""
+        active = self.active_version()
+        versions = []
+        for version in self.versions():
+            try:
+                if source is None or self.metadata(version).get('source') == source:
+                    versions.append(version)
+            except (OSError, ValueError):
+                continue
+        for version in versions[:max(0, len(versions) - self.keep)]:
+            if version != active:
+                shutil.rmtree(self.version_path(version), ignore_errors=True)
@@ -1,57 +1,295 @@
 import numpy as np
+import pandas as pd
 import logging
 from sklearn.linear_model import SGDClassifier
 from sklearn.preprocessing import StandardScaler
 import joblib
+import atexit
+import copy
 import os
+import tempfile
+import threading
+import time
 from datetime import datetime
+from model.model_registry import ModelRegistry
+from model.checkpointer import BackgroundCheckpointer
+from model.feedback_log import FeedbackLog
+from model.scoring_engine import FEATURE_COLUMNS
+from model.weights_snapshot import write_weights_snapshot, load_weights_snapshot, fuse, model_stamp, snapshot_stamp
 
 logger = logging.getLogger(__name__)
 
 class OnlineLearner:
-    def __init__(self):
+    """Apprentissage en ligne (SGD log_loss) à partir des retours utilisateurs.
+
+    Les retours sont mis en tampon (add_feedback) et appliqués par mini-lots : un seul
+    partial_fit du scaler et du modèle, puis une seule publication dans le registre,
+    dès que batch_size lignes sont en attente ou que la plus ancienne a max_age secondes.
+
+    La publication dans le registre est découplée des mises à jour : un thread de fond
+    publie une copie du modèle au plus toutes les checkpoint_interval secondes, ou après
+    checkpoint_updates lignes apprises. close() applique le tampon et publie ce qui reste.
+
+    Un seul processus apprend (le worker Celery de la file 'learner', concurrence 1) : il
+    devient écrivain au premier retour reçu. Il publie aussi, toutes les snapshot_interval
+    secondes au plus, un instantané compact des poids (coef_, intercept_, statistiques du
+    scaler : 57 float64 bruts, remplacés atomiquement) ; les autres
+    processus ne font que prédire et rechargent cet instantané quand son mtime change,
+    sans relire les pickles du registre. Le moteur de scoring l'applique de la même façon
+    à la version en ligne active (ScoringEngine(weights_snapshot_path=...)) : les versions
+    publiées dans le registre servent à la reprise et au retour arrière, elles ne sont
+    plus activées à chaque publication.
+
+    Chaque retour reçu par l'écrivain est d'abord ajouté au journal feedback_log
+    (FeedbackLog) : rebuild_from_feedback_log() reconstruit le modèle en le rejouant.
+
+    Un nouveau modèle est initialisé à partir de données étiquetées réelles, lues par
+    lots : l'historique des prédictions confirmées (history_source) puis le jeu
+    d'entraînement CSV (training_data_path). Seul l'écrivain initialise et publie : le
+    worker 'learner' (writer=True) dès son démarrage, sinon le premier processus qui
+    reçoit un retour. Les autres processus attendent la version publiée dans le
+    registre ou l'instantané des poids.
+    """
+
+    LABEL_COLUMN = 'PotentialFraud'
+
+    def __init__(self, registry=None, batch_size=100, max_age=30.0, checkpoint_interval=10.0, checkpoint_updates=1000,
+                 snapshot_path=None, snapshot_interval=1.0, check_interval=1.0, feedback_log=None,
+                 training_data_path='data/creditcarddata.csv', history_source=None, warm_start_chunk_rows=100000,
+                 warm_start_min_updates=100000, warm_start_max_epochs=50, writer=False):
         self.model = None
         self.scaler = StandardScaler()
         self.model_path = 'model/fraud_model.pkl'
         self.scaler_path = 'model/scaler.pkl'
+        self.registry = registry or ModelRegistry()
+        self.version = None
+        # Tampon des retours non appliqués: liste de (features (n, 13), labels (n,))
         self.feedback_data = []
-        self.batch_size = 100
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self._pending_rows = 0
+        self._flush_timer = None
+        self._lock = threading.RLock()
+        self.checkpointer = BackgroundCheckpointer(
+            self._snapshot, self._write_checkpoint,
+            interval=checkpoint_interval, max_updates=checkpoint_updates, name='online-checkpointer'
+        )
+        self.feedback_log = feedback_log
+        self.training_data_path = training_data_path
+        # history_source(chunk_rows) -> itérateur de (features (n, 13), labels (n,))
+        self.history_source = history_source
+        self.warm_start_chunk_rows = warm_start_chunk_rows
+        # Petits jeux de données : plusieurs époques, jusqu'à warm_start_min_updates pas de SGD
+        self.warm_start_min_updates = warm_start_min_updates
+        self.warm_start_max_epochs = warm_start_max_epochs
+        self.warm_start_report = None
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self.is_writer = False
+        self._snapshot_mtime = None
+        self._next_snapshot_check = 0.0
+        self._next_registry_check = 0.0
+        self.broadcaster = BackgroundCheckpointer(
+            self._weights_snapshot, self._write_weights_snapshot,
+            interval=snapshot_interval, max_updates=batch_size, name='online-weights'
+        ) if snapshot_path else None
+        # Poids fusionnés scaler + coef_ : score = sigmoid(x . fused_weights + fused_bias)
+        self.fused_weights = None
+        self.fused_bias = 0.0
         self.load_model()
+        if writer:
+            self._become_writer()
+        # Les retours encore en tampon sont appliqués et publiés à l'arrêt du processus
+        atexit.register(self.close)
         
     def load_model(self):
-        """Charge le modèle existant ou en crée un nouveau"""
+        """Charge le modèle existant, sans en créer : seul l'écrivain initialise (_become_writer)"""
         try:
             os.makedirs('model', exist_ok=True)
             
+            # Reprise depuis la dernière version publiée par l'apprentissage en ligne
+            if self.load_published():
+                return
             if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
                 self.model = joblib.load(self.model_path)
                 self.scaler = joblib.load(self.scaler_path)
+                self.refresh_fused_weights()
                 logger.info("Modèle chargé avec succès")
-            else:
-                self.initialize_model()
-                logger.info("Nouveau modèle initialisé")
+                return
         except Exception as e:
             logger.error(f"Erreur chargement modèle: {str(e)}")
-            self.initialize_model()
+        
+        self.model = None
+        logger.info("Aucun modèle en ligne publié")
+    
+    def load_published(self):
+        """Charge la dernière version publiée par l'apprentissage en ligne ; False s'il n'y en a pas"""
+        version = self.registry.latest_version(source='online')
+        if version is None:
+            return False
+        model, scaler, _ = self.registry.load(version)
+        with self._lock:
+            self.model, self.scaler, self.version = model, scaler, version
+            self.refresh_fused_weights()
+        logger.info(f"Modèle chargé depuis le registre (version {version})")
+        return True
     
-    def initialize_model(self):
-        """Initialise un nouveau modèle"""
-        self.model = SGDClassifier(
+    def csv_batches(self, chunk_rows):
+        """Lots (features, labels) du jeu d'entraînement CSV, lus par morceaux"""
+        reader = pd.read_csv(self.training_data_path, usecols=FEATURE_COLUMNS + [self.LABEL_COLUMN], chunksize=chunk_rows)
+        for chunk in reader:
+            chunk = chunk.dropna()
+            yield chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float64), chunk[self.LABEL_COLUMN].to_numpy(dtype=np.int64)
+    
+    def warm_start_sources(self, include_history=True):
+        sources = []
+        if include_history and self.history_source is not None:
+            sources.append(('historique', self.history_source))
+        if self.training_data_path and os.path.exists(self.training_data_path):
+            sources.append(('csv', self.csv_batches))
+        return sources
+    
+    def initialize_model(self, include_history=True):
+        """Initialise un nouveau modèle à partir des données étiquetées disponibles
+
+        Chaque source est lue une seule fois, par lots (mémoire bornée par un lot) : les
+        statistiques du scaler sont accumulées et les lignes sont copiées dans un journal
+        temporaire (FeedbackLog, 61 octets par ligne). Les époques de partial_fit relisent
+        ensuite ce journal par memmap, sans reparser le CSV ni redécoder le JSON : une seule
+        pour un gros volume, plusieurs pour un petit jeu de données.
+        Sans aucune ligne étiquetée, repli sur une initialisation aléatoire.
+        """
+        model = SGDClassifier(
             loss='log_loss',
             learning_rate='optimal',
             eta0=0.1,
             random_state=42
         )
-        self.scaler = StandardScaler()
+        # Nouvelle lignée de poids (t repart de 0) : ses instantanés remplacent ceux de l'ancienne
+        model.generation_ = time.time()
+        scaler = StandardScaler()
+        start = time.perf_counter()
         
-        # Données d'initialisation simulées
-        X_initial = np.random.randn(100, 13)
-        y_initial = np.random.choice([0, 1], size=100, p=[0.9, 0.1])
+        rows = {}
+        with tempfile.TemporaryDirectory(prefix='warm_start_') as spill_dir:
+            spill = FeedbackLog(os.path.join(spill_dir, 'warm_start.log'))
+            for name, source in self.warm_start_sources(include_history):
+                rows[name] = 0
+                try:
+                    for features, labels in source(self.warm_start_chunk_rows):
+                        if len(features):
+                            scaler.partial_fit(features)
+                            spill.append(features, labels, timestamps=0.0)
+                            rows[name] += len(features)
+                except Exception as e:
+                    # Les lignes déjà lues restent (le scaler les a vues) ; les sources suivantes sont lues
+                    logger.error(f"Erreur lecture source d'initialisation {name}: {str(e)}")
+            read_seconds = time.perf_counter() - start
+            
+            epochs = 0
+            if len(spill):
+                epochs = int(min(self.warm_start_max_epochs, max(1, np.ceil(self.warm_start_min_updates / len(spill)))))
+                for _ in range(epochs):
+                    for features, labels in spill.iter_batches(self.warm_start_chunk_rows):
+                        model.partial_fit(scaler.transform(features), labels, classes=[0, 1])
+            else:
+                logger.warning("Aucune donnée étiquetée: initialisation sur données simulées")
+                X_initial = np.random.randn(100, 13)
+                y_initial = np.random.choice([0, 1], size=100, p=[0.9, 0.1])
+                scaler = StandardScaler().fit(X_initial)
+                model.partial_fit(scaler.transform(X_initial), y_initial, classes=[0, 1])
         
-        self.scaler.fit(X_initial)
-        X_scaled = self.scaler.transform(X_initial)
-        self.model.partial_fit(X_scaled, y_initial, classes=[0, 1])
+        seconds = time.perf_counter() - start
+        self.warm_start_report = {
+            'rows': rows,
+            'epochs': epochs,
+            'read_seconds': round(read_seconds, 3),
+            'fit_seconds': round(seconds - read_seconds, 3),
+            'seconds': round(seconds, 3)
+        }
+        logger.info(f"Modèle en ligne initialisé: {rows} lignes, {epochs} époque(s) en {seconds:.2f}s "
+                    f"(lecture {read_seconds:.2f}s, apprentissage {seconds - read_seconds:.2f}s)")
+        with self._lock:
+            self.model, self.scaler = model, scaler
+            self.refresh_fused_weights()
         self.save_model()
+        # Nouvelle génération diffusée même sans retour à rejouer : les lecteurs quittent l'ancienne lignée
+        if self.broadcaster is not None:
+            self.broadcaster.mark_dirty()
+    
+    def add_feedback(self, data):
+        """Met en tampon des retours ({'features': [...], 'labels': [...]}) ; applique le mini-lot s'il est plein
+
+        Retourne le nombre de lignes encore en attente.
+        """
+        try:
+            features = np.atleast_2d(np.asarray(data['features'], dtype=np.float64))
+            labels = np.asarray(data['labels'], dtype=np.int64).ravel()
+            if len(features) == 0:
+                return self._pending_rows
+            if len(features) != len(labels):
+                raise ValueError(f"{len(features)} lignes de features pour {len(labels)} labels")
+        except Exception as e:
+            logger.error(f"Erreur retour d'apprentissage: {str(e)}")
+            return self._pending_rows
+        
+        with self._lock:
+            if not self.is_writer:
+                self._become_writer()
+            if self.feedback_log is not None:
+                try:
+                    self.feedback_log.append(features, labels)
+                except Exception as e:
+                    logger.error(f"Erreur journal des retours: {str(e)}")
+            self.feedback_data.append((features, labels))
+            self._pending_rows += len(features)
+            if self._pending_rows >= self.batch_size:
+                self.flush()
+            elif self._flush_timer is None and self.max_age:
+                # Le premier retour d'un mini-lot arme l'échéance : un tampon n'attend jamais plus de max_age
+                self._flush_timer = threading.Timer(self.max_age, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+            return self._pending_rows
+    
+    def flush(self):
+        """Applique tous les retours en attente en un seul mini-lot"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self.feedback_data:
+                return 0
+            features = np.concatenate([item[0] for item in self.feedback_data])
+            labels = np.concatenate([item[1] for item in self.feedback_data])
+            self.feedback_data = []
+            self._pending_rows = 0
+            self.partial_fit({'features': features, 'labels': labels})
+            return len(features)
+    
+    def rebuild_from_feedback_log(self, until=None, batch_size=100000):
+        """Réinitialise le modèle puis rejoue le journal des retours (jusqu'à l'horodatage until)
+
+        Démarrage à chaud d'un nouveau déploiement, ou retour arrière à un instant donné.
+        Retourne le nombre de lignes rejouées.
+        """
+        if self.feedback_log is None:
+            raise ValueError("Aucun journal des retours configuré")
+        with self._lock:
+            # Les retours en tampon sont déjà dans le journal : ils seront rejoués s'ils précèdent until
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self.feedback_data = []
+            self._pending_rows = 0
+            self.is_writer = True
+            # Sans l'historique: les retours confirmés sont ceux du journal, ils ne sont pas comptés deux fois
+            self.initialize_model(include_history=False)
+            rows, _ = self.feedback_log.replay(self, batch_size=batch_size, until=until)
+        self.checkpointer.flush()
+        if self.broadcaster is not None:
+            self.broadcaster.flush()
+        return rows
     
     def partial_fit(self, data):
         """Met à jour le modèle avec de nouvelles données"""
@@ -62,67 +300,202 @@ class OnlineLearner:
             if len(features) == 0:
                 return
             
-            # Adaptation du scaler
-            if hasattr(self.scaler, 'n_samples_seen_'):
-                self.scaler.partial_fit(features)
-            else:
-                self.scaler.fit(features)
-            
-            # Normalisation des features
-            features_scaled = self.scaler.transform(features)
-            
-            # Apprentissage en ligne du modèle
-            self.model.partial_fit(features_scaled, labels, classes=[0, 1])
-            
-            # Sauvegarde du modèle mis à jour
-            self.save_model()
+            with self._lock:
+                # Adaptation du scaler
+                if hasattr(self.scaler, 'n_samples_seen_'):
+                    self.scaler.partial_fit(features)
+                else:
+                    self.scaler.fit(features)
+                
+                # Normalisation des features
+                features_scaled = self.scaler.transform(features)
+                
+                # Apprentissage en ligne du modèle
+                self.model.partial_fit(features_scaled, labels, classes=[0, 1])
+                self.refresh_fused_weights()
+                
+                # Publication différée, regroupée et hors du chemin de la tâche
+                self.checkpointer.mark_dirty(len(features))
+                if self.broadcaster is not None:
+                    self.broadcaster.mark_dirty(len(features))
             
             logger.info(f"Modèle mis à jour avec {len(features)} nouveaux échantillons")
             
         except Exception as e:
             logger.error(f"Erreur mise à jour modèle: {str(e)}")
     
+    def refresh_fused_weights(self):
+        """Replie la normalisation du scaler dans les coefficients du modèle linéaire (voir weights_snapshot.fuse)"""
+        coef = np.asarray(self.model.coef_[0], dtype=np.float64)
+        intercept = float(self.model.intercept_[0])
+        
+        if hasattr(self.scaler, 'mean_'):
+            self.fused_weights, self.fused_bias = fuse(coef, intercept, self.scaler.mean_, self.scaler.scale_)
+        else:
+            self.fused_weights = coef
+            self.fused_bias = intercept
+    
+    def _weights_snapshot(self):
+        """État minimal du modèle linéaire et du scaler (suffisant pour prédire et reprendre l'apprentissage)"""
+        with self._lock:
+            return np.concatenate([
+                [*model_stamp(self.model), self.model.intercept_[0], self.scaler.n_samples_seen_, time.time()],
+                self.model.coef_[0], self.scaler.mean_, self.scaler.scale_, self.scaler.var_
+            ]).astype(np.float64)
+    
+    def _write_weights_snapshot(self, state):
+        write_weights_snapshot(self.snapshot_path, state)
+    
+    def load_weights_snapshot(self):
+        """Instantané publié par l'écrivain (dict nom -> valeur), ou None"""
+        return load_weights_snapshot(self.snapshot_path)
+    
+    def refresh_from_snapshot(self, force=False):
+        """Processus lecteur: reprend les poids de l'écrivain si l'instantané a changé (un stat par check_interval)"""
+        if self.snapshot_path is None or self.is_writer:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_snapshot_check:
+            return False
+        self._next_snapshot_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._snapshot_mtime:
+            return False
+        snapshot = self.load_weights_snapshot()
+        if snapshot is None:
+            return False
+        self.fused_weights, self.fused_bias = fuse(snapshot['coef'], snapshot['intercept'],
+                                                   snapshot['mean'], snapshot['scale'])
+        self._snapshot_mtime = mtime
+        return True
+    
+    def _become_writer(self):
+        """Démarrage du worker 'learner' ou premier retour reçu : reprend l'état le plus récent avant d'apprendre
+
+        L'instantané des poids est plus récent que la dernière version du registre (publiée
+        moins souvent) : s'il est d'une génération plus récente que le modèle chargé, ou de la
+        même génération avec plus d'échantillons vus, il est adopté.
+        """
+        self.is_writer = True
+        if self.model is None:
+            # Aucun modèle publié au démarrage de ce processus : dernière version, sinon démarrage à chaud
+            try:
+                loaded = self.load_published()
+            except Exception as e:
+                logger.error(f"Erreur chargement modèle: {str(e)}")
+                loaded = False
+            if not loaded:
+                self.initialize_model()
+                logger.info("Nouveau modèle initialisé")
+                return
+        if self.snapshot_path is None:
+            return
+        snapshot = self.load_weights_snapshot()
+        if snapshot is None or snapshot_stamp(snapshot) <= model_stamp(self.model):
+            return
+        try:
+            self.model.coef_ = snapshot['coef'].reshape(1, -1).copy()
+            self.model.intercept_ = np.array([float(snapshot['intercept'])])
+            self.model.t_ = float(snapshot['t'])
+            self.model.generation_ = float(snapshot['generation'])
+            self.scaler.mean_ = snapshot['mean'].copy()
+            self.scaler.scale_ = snapshot['scale'].copy()
+            self.scaler.var_ = snapshot['var'].copy()
+            self.scaler.n_samples_seen_ = int(snapshot['n_samples_seen'])
+            self.refresh_fused_weights()
+            logger.info(f"Apprentissage repris depuis l'instantané des poids ({int(snapshot['t'])} échantillons)")
+        except Exception as e:
+            logger.error(f"Erreur reprise instantané des poids: {str(e)}")
+    
     def predict(self, features):
-        """Fait une prédiction avec le modèle actuel"""
+        """Fait une prédiction avec le modèle actuel
+
+        Accepte une transaction (vecteur) ou une matrice de transactions ; pour un
+        vecteur retourne (label, [P(0), P(1)]), pour une matrice (labels, probabilités (n, 2)).
+        """
         try:
-            features_array = np.array(features).reshape(1, -1)
+            features_array = np.asarray(features, dtype=np.float64)
+            single = features_array.ndim == 1
+            self.refresh_from_snapshot()
             
-            if hasattr(self.scaler, 'mean_'):
-                features_scaled = self.scaler.transform(features_array)
-            else:
-                features_scaled = features_array
-            
-            prediction = self.model.predict(features_scaled)[0]
+            if self.fused_weights is None:
+                if self.model is None:
+                    self._wait_for_publication()
+                self.refresh_fused_weights()
             
-            # Pour SGDClassifier avec log_loss, on a predict_proba
-            if hasattr(self.model, 'predict_proba'):
-                probabilities = self.model.predict_proba(features_scaled)[0]
-            else:
-                # Fallback pour les modèles sans predict_proba
-                decision = self.model.decision_function(features_scaled)[0]
-                probabilities = [1 / (1 + np.exp(-decision)), 1 / (1 + np.exp(decision))]
-                probabilities = probabilities / np.sum(probabilities)
+            # Un seul produit scalaire + sigmoid (équivalent à predict_proba pour log_loss)
+            decision = np.atleast_2d(features_array) @ self.fused_weights + self.fused_bias
+            fraud_proba = 1.0 / (1.0 + np.exp(-np.clip(decision, -500, 500)))
+            labels = (decision > 0).astype(int)
+            probabilities = np.column_stack([1.0 - fraud_proba, fraud_proba])
             
-            return prediction, probabilities
+            if single:
+                return labels[0], probabilities[0]
+            return labels, probabilities
         except Exception as e:
             logger.error(f"Erreur prédiction: {str(e)}")
             return 0, [0.5, 0.5]
     
+    def _wait_for_publication(self):
+        """Lecteur sans modèle : charge la version de l'apprenant dès qu'elle est publiée (au plus une fois par check_interval)"""
+        now = time.monotonic()
+        if now < self._next_registry_check:
+            raise RuntimeError("Modèle en ligne pas encore publié")
+        self._next_registry_check = now + self.check_interval
+        if not self.load_published():
+            raise RuntimeError("Modèle en ligne pas encore publié")
+    
+    def _snapshot(self):
+        """Copie cohérente du modèle et du scaler (les mises à jour continuent pendant l'écriture)"""
+        with self._lock:
+            return copy.deepcopy(self.model), copy.deepcopy(self.scaler)
+    
+    def _write_checkpoint(self, state):
+        model, scaler = state
+        self.publish(model, scaler)
+    
+    def publish(self, model, scaler):
+        """Publie model et scaler comme nouvelle version du registre (écriture atomique) ; lève en cas d'échec
+
+        La version n'est activée que si aucune version n'est active (premier déploiement),
+        en mode live : le scoring suit alors l'instantané des poids. Les publications
+        suivantes ne basculent pas les workers, qui n'ont donc aucun pickle à recharger.
+        """
+        activate = self.registry.active_version() is None
+        self.version = self.registry.publish(model, scaler, source='online', activate=activate, live=activate)
+        logger.info("Modèle sauvegardé avec succès")
+        return self.version
+    
     def save_model(self):
-        """Sauvegarde le modèle et le scaler"""
+        """Publie immédiatement le modèle courant"""
         try:
-            joblib.dump(self.model, self.model_path)
-            joblib.dump(self.scaler, self.scaler_path)
-            logger.info("Modèle sauvegardé avec succès")
+            self.publish(*self._snapshot())
         except Exception as e:
             logger.error(f"Erreur sauvegarde modèle: {str(e)}")
     
+    def close(self):
+        """Arrêt du processus: applique les retours en tampon puis publie toute mise à jour non écrite"""
+        try:
+            self.flush()
+            self.checkpointer.flush()
+            if self.broadcaster is not None:
+                self.broadcaster.flush()
+        except Exception as e:
+            logger.error(f"Erreur arrêt apprentissage en ligne: {str(e)}")
+    
     def get_model_info(self):
         """Retourne les informations du modèle"""
         if hasattr(self.model, 'coef_'):
             return {
                 'type': type(self.model).__name__,
                 'n_features': len(self.model.coef_[0]) if self.model.coef_ is not None else 0,
-                'n_samples': self.model.t_ if hasattr(self.model, 't_') else 0
+                'version': self.version,
+                'n_samples': self.model.t_ if hasattr(self.model, 't_') else 0,
+                'pending_feedback': self._pending_rows,
+                'is_writer': self.is_writer,
+                'checkpoint': self.checkpointer.get_stats()
             }
         return {'type': 'Non initialisé'}
\ No newline at end of file
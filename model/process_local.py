@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessThread:
+    """Thread de fond démarré à la demande, une fois par processus.
+
+    Après un fork (gunicorn --preload, Celery prefork), le thread du parent n'existe
+    pas dans l'enfant : ensure_started() le relance, après avoir appelé on_start()
+    pour réinitialiser l'état hérité du parent (files, statistiques).
+    """
+
+    def __init__(self, target, name, on_start=None):
+        self.target = target
+        self.name = name
+        self.on_start = on_start
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def is_running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def ensure_started(self):
+        if self.is_running():
+            return
+        with self._lock:
+            if self.is_running():
+                return
+            if self.on_start is not None:
+                self.on_start()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+
+def write_process_summary(output_dir, summary):
+    """Écrit le résumé de ce processus dans <output_dir>/summary.<pid>.json (remplacement atomique)"""
+    path = os.path.join(output_dir, f'summary.{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(summary, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_process_summaries(output_dir, key):
+    """Résumés de tous les processus pour la valeur de key du résumé le plus récent
+
+    Retourne (valeur, résumés) ; les résumés illisibles (écriture en cours, fichier
+    tronqué) sont ignorés.
+    """
+    summaries = []
+    if os.path.isdir(output_dir):
+        for filename in os.listdir(output_dir):
+            if filename.startswith('summary.') and filename.endswith('.json'):
+                try:
+                    with open(os.path.join(output_dir, filename)) as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+    if not summaries:
+        return None, []
+    current = max(summaries, key=lambda summary: summary['updated_at'])[key]
+    return current, [summary for summary in summaries if summary[key] == current]
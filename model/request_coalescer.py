@@ -0,0 +1,97 @@
+import numpy as np
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from model.process_local import ProcessThread
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Regroupe les demandes de scoring concurrentes en micro-lots.
+
+    Chaque appelant soumet une ligne et reçoit un Future ; un thread de fond
+    accumule les lignes pendant au plus max_wait_ms (ou max_batch_rows lignes)
+    puis exécute un seul appel de scoring pour tout le lot. score_fn(X) retourne
+    (probabilités, version du modèle) ; chaque Future est résolu en (probabilité, version).
+    """
+
+    def __init__(self, score_fn, max_wait_ms=2.0, max_batch_rows=64):
+        self.score_fn = score_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue()
+        # Thread de fond démarré une fois par processus, y compris après un fork gunicorn
+        self._thread = ProcessThread(self._run, 'scoring-coalescer', on_start=self._reset_process)
+        self._last_batch_size = 0
+        self._n_batches = 0
+        self._n_rows = 0
+        self._max_batch_seen = 0
+
+    def _reset_process(self):
+        self._queue = queue.Queue()
+
+    def submit(self, features):
+        """Soumet une transaction (13 features) et retourne un Future sur (probabilité de fraude, version)"""
+        self._thread.ensure_started()
+        future = Future()
+        self._queue.put((np.asarray(features, dtype=np.float64).ravel(), future))
+        return future
+
+    def score_one(self, features, timeout=None):
+        """Score une transaction via le micro-lot courant ; retourne (probabilité, version)"""
+        return self.submit(features).result(timeout=timeout)
+
+    def _collect(self):
+        """Attend une première demande puis complète le lot jusqu'au délai ou à la taille max"""
+        batch = [self._queue.get()]
+
+        # Sans charge (lot précédent unitaire et file vide), inutile d'attendre d'autres demandes
+        if self._last_batch_size > 1 or not self._queue.empty():
+            deadline = time.perf_counter() + self.max_wait
+        else:
+            deadline = 0
+
+        while len(batch) < self.max_batch_rows:
+            try:
+                remaining = deadline - time.perf_counter()
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Demandes annulées par leur appelant (délai dépassé) : ni scorées ni résolues
+            batch = [(row, future) for row, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                probabilities, version = self.score_fn(np.vstack([row for row, _ in batch]))
+                for future, probability in zip(futures, probabilities):
+                    future.set_result((float(probability), version))
+            except Exception as e:
+                logger.error(f"Erreur scoring micro-lot: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+
+            self._last_batch_size = len(batch)
+            self._n_batches += 1
+            self._n_rows += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+
+    def get_stats(self):
+        """Statistiques des micro-lots pour la supervision"""
+        return {
+            'batches': self._n_batches,
+            'rows': self._n_rows,
+            'avg_batch_size': round(self._n_rows / self._n_batches, 2) if self._n_batches else 0,
+            'max_batch_size': self._max_batch_seen,
+            'max_wait_ms': self.max_wait * 1000,
+            'max_batch_rows': self.max_batch_rows
+        }
@@ -0,0 +1,510 @@
+import numpy as np
+import logging
+import copy
+import joblib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from model.tree_compiler import CompiledForest, compile_ensemble
+from model.cascade_scorer import CascadeScorer
+from model.weights_snapshot import load_weights_snapshot, fuse, model_stamp, snapshot_stamp
+
+logger = logging.getLogger(__name__)
+
+# Colonnes du dataset d'entraînement (data/creditcarddata.csv), dans l'ordre attendu par le modèle.
+# Le formulaire et les fichiers CSV utilisent aussi les alias feature_1 ... feature_13.
+FEATURE_COLUMNS = [
+    'TransactionAmount', 'TransactionHour', 'DayOfWeek', 'IsWeekend',
+    'CustomerHistory', 'MerchantRisk', 'LocationMismatch', 'DeviceChange',
+    'Velocity_1h', 'Velocity_24h', 'AvgTransaction', 'CustomerAge', 'AccountAgeDays'
+]
+N_FEATURES = len(FEATURE_COLUMNS)
+
+
+class ScoringTimeout(TimeoutError):
+    """Délai de scoring dépassé (ou threads de scoring saturés) sans score de repli disponible"""
+
+
+class LoadedModel:
+    """Modèle chargé et prêt à scorer ; immuable, remplacé en bloc lors d'une bascule"""
+
+    def __init__(self, model, scaler, compiled=None, version=None, registry_version=None, fast=None, source='training',
+                 live=False):
+        self.model = model
+        self.compiled = compiled
+        # Modèle linéaire rapide (CascadeScorer) : pré-filtre de la cascade et score de repli
+        self.fast = fast
+        self.name = type(model).__name__
+        self.version = version
+        self.registry_version = registry_version
+        # Origine dans le registre ('training', 'challenger', 'online') ; les artefacts historiques sont des modèles d'entraînement
+        self.source = source
+        # Paramètres du scaler extraits pour normaliser sans repasser par sklearn
+        if scaler is not None and hasattr(scaler, 'mean_'):
+            self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+            self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        else:
+            self.mean = None
+            self.scale = None
+        # Version en ligne live : scorée par les poids fusionnés (scaler replié), mis à jour depuis l'instantané
+        self.fused = None
+        self.snapshot_samples = None
+        if live and source == 'online' and self.mean is not None and hasattr(model, 'coef_'):
+            self.fused = fuse(np.asarray(model.coef_, dtype=np.float64)[0], float(model.intercept_[0]),
+                              self.mean, self.scale)
+
+
+class ScoringEngine:
+    """Moteur de scoring partagé par toutes les routes de prédiction.
+
+    Le modèle et le scaler sont chargés une seule fois par worker ; chaque appel
+    score une matrice 2-D complète avec un unique predict_proba. Quand un registre
+    est fourni, la version active est surveillée (un stat du manifeste au plus toutes
+    les check_interval secondes) et rechargée en arrière-plan puis échangée par
+    simple affectation de référence, sans verrou sur le chemin de scoring.
+
+    Avec cascade_band=(low, high), un modèle linéaire du même entraînement pré-filtre
+    toutes les lignes et seules celles de la bande incertaine passent par le modèle actif.
+    score_within() borne la latence : passé le délai, le score du modèle linéaire
+    (ou de self.fallback) est retourné et marqué comme dégradé. Au plus
+    deadline_workers appels sont en cours à la fois : au-delà, le repli est retourné
+    immédiatement plutôt que d'allonger une file d'appels déjà en retard.
+
+    Quand la version active est une version en ligne activée en mode live, ses poids
+    fusionnés suivent l'instantané publié par l'apprenant (weights_snapshot_path) :
+    un stat au plus toutes les check_interval secondes, puis 57 float64 relus et
+    repliés si le mtime a changé, sans recharger de pickle.
+    """
+
+    # Artefacts historiques utilisés tant que le registre est vide :
+    # modèle entraîné par train_model.py, puis modèle en ligne
+    MODEL_FILES = ['best_model.pkl', 'fraud_model.pkl']
+
+    def __init__(self, model_dir='model/', threshold=0.5, latency_window=2048, compiled_max_rows=16,
+                 mmap=True, registry=None, check_interval=1.0, cascade_band=None, deadline_workers=4,
+                 weights_snapshot_path=None):
+        self.model_dir = model_dir
+        # Artefacts ouverts en lecture seule mappée : les pages sont partagées entre workers
+        self.mmap_mode = 'r' if mmap else None
+        self.threshold = threshold
+        # Au-delà de ce nombre de lignes, le predict_proba natif (vectorisé en C) redevient plus rapide
+        self.compiled_max_rows = compiled_max_rows
+        self.registry = registry
+        self.check_interval = check_interval
+        self.cascade_band = cascade_band
+        self.weights_snapshot_path = weights_snapshot_path
+        self._snapshot_mtime = None
+        self._next_snapshot_check = 0.0
+        # Score de repli si aucun modèle linéaire n'accompagne la version active: fonction X -> probabilités
+        self.fallback = None
+        # Version enregistrée pour les scores de self.fallback
+        self.fallback_version = 'fallback'
+        self.deadline_workers = deadline_workers
+        self._executor = None
+        self._executor_pid = None
+        self._n_deadline_calls = 0
+        self._n_fallbacks = 0
+        self._n_shed = 0
+        self._in_flight = 0
+        self._active = None
+        self._manifest_stamp = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._latencies = np.zeros(latency_window)
+        self._latency_pos = 0
+        self._n_calls = 0
+        self._n_rows = 0
+        self.listeners = []
+        self.load_model()
+
+    @property
+    def active(self):
+        """LoadedModel courant (référence immuable)"""
+        return self._active
+
+    @property
+    def model(self):
+        return self._active.model if self._active else None
+
+    @property
+    def compiled(self):
+        return self._active.compiled if self._active else None
+
+    @property
+    def model_name(self):
+        return self._active.name if self._active else None
+
+    @property
+    def model_version(self):
+        return self._active.version if self._active else None
+
+    def load_model(self):
+        """Charge la version active du registre, sinon les artefacts historiques"""
+        loaded = None
+        if self.registry is not None:
+            stamp = self.registry.manifest_stamp()
+            loaded = self._load_from_registry()
+            # Empreinte retenue seulement si la version a pu être chargée : sinon check_for_update réessaiera
+            if loaded is not None:
+                self._manifest_stamp = stamp
+        if loaded is None:
+            loaded = self._load_from_files()
+
+        if loaded is None:
+            logger.warning("Moteur de scoring: aucun modèle disponible")
+            return False
+
+        self._active = loaded
+        logger.info(f"Moteur de scoring: {loaded.version} chargé")
+        return True
+
+    def _load_from_registry(self):
+        manifest = self.registry.active_manifest()
+        if manifest is None:
+            return None
+        version = manifest['version']
+        try:
+            model, scaler, meta = self.registry.load(version, mmap_mode=self.mmap_mode)
+            if not self._accepts_readonly(model):
+                model, scaler, meta = self.registry.load(version)
+            compiled_dir = os.path.join(self.registry.version_path(version), 'compiled')
+            compiled = self._load_compiled(model, compiled_dir)
+            fast = self._load_fast(model, scaler, version)
+            # Manifeste antérieur au mode live : une version en ligne active suivait déjà l'apprenant
+            live = manifest.get('live', True)
+            return LoadedModel(model, scaler, compiled, f"{type(model).__name__}-v{version}", version, fast,
+                               source=meta.get('source', 'training'), live=live)
+        except Exception as e:
+            logger.error(f"Erreur chargement version {version}: {str(e)}")
+            return None
+
+    def _load_fast(self, model, scaler, version):
+        """Modèle linéaire rapide : le modèle actif s'il est linéaire, sinon un challenger linéaire du même entraînement"""
+        low, high = self.cascade_band or (0.05, 0.95)
+        if hasattr(model, 'coef_') and np.asarray(model.coef_).shape[0] == 1:
+            return CascadeScorer(model, scaler, low, high)
+        if self.registry is None or version is None:
+            return None
+        run = self.registry.metadata(version).get('training_run')
+        if run is None:
+            return None
+        for candidate in self.registry.versions():
+            try:
+                meta = self.registry.metadata(candidate)
+                if meta.get('source') != 'challenger' or meta.get('training_run') != run:
+                    continue
+                fast_model, fast_scaler, _ = self.registry.load(candidate)
+            except Exception as e:
+                logger.error(f"Erreur chargement pré-filtre v{candidate}: {str(e)}")
+                continue
+            if hasattr(fast_model, 'coef_') and np.asarray(fast_model.coef_).shape[0] == 1:
+                logger.info(f"Modèle rapide: {meta.get('model_name', meta['name'])}-v{candidate}")
+                return CascadeScorer(fast_model, fast_scaler, low, high)
+        logger.warning(f"Aucun challenger linéaire pour la version {version}")
+        return None
+
+    def _load_from_files(self):
+        scaler_path = os.path.join(self.model_dir, 'scaler.pkl')
+
+        for filename in self.MODEL_FILES:
+            model_path = os.path.join(self.model_dir, filename)
+            if not os.path.exists(model_path):
+                continue
+            try:
+                model = joblib.load(model_path, mmap_mode=self.mmap_mode)
+                if not self._accepts_readonly(model):
+                    model = joblib.load(model_path)
+                scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+            except Exception as e:
+                logger.error(f"Erreur chargement {filename}: {str(e)}")
+                continue
+
+            compiled_dir = os.path.splitext(model_path)[0] + '_compiled'
+            fresh = (os.path.exists(os.path.join(compiled_dir, 'meta.json')) and
+                     os.path.getmtime(os.path.join(compiled_dir, 'meta.json')) >= os.path.getmtime(model_path))
+            compiled = self._load_compiled(model, compiled_dir if fresh else None)
+            version = f"{type(model).__name__}-{int(os.path.getmtime(model_path))}"
+            return LoadedModel(model, scaler, compiled, version, fast=self._load_fast(model, scaler, None))
+        return None
+
+    def _accepts_readonly(self, model):
+        """Certains estimateurs (SVC/libsvm) refusent les tableaux mappés en lecture seule"""
+        if self.mmap_mode is None:
+            return True
+        try:
+            model.predict_proba(np.zeros((1, getattr(model, 'n_features_in_', N_FEATURES))))
+            return True
+        except ValueError as e:
+            if 'read-only' not in str(e):
+                return True
+            logger.warning(f"{type(model).__name__}: artefacts mappés non supportés, chargement en mémoire")
+            return False
+
+    def _load_compiled(self, model, compiled_dir):
+        """Ouvre l'export .npy s'il existe, sinon compile l'ensemble en mémoire"""
+        if not self.compiled_max_rows:
+            return None
+        if compiled_dir and os.path.exists(os.path.join(compiled_dir, 'meta.json')):
+            try:
+                return CompiledForest.load(compiled_dir, mmap_mode=self.mmap_mode)
+            except Exception as e:
+                logger.error(f"Erreur chargement {compiled_dir}: {str(e)}")
+        return compile_ensemble(model)
+
+    def check_for_update(self):
+        """Détecte une bascule du registre et recharge en arrière-plan (non bloquant)"""
+        self._next_check = time.monotonic() + self.check_interval
+        stamp = self.registry.manifest_stamp()
+        if stamp is None or stamp == self._manifest_stamp:
+            return False
+        # Un seul rechargement à la fois ; les autres appels continuent avec l'ancien modèle
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._reload, args=(stamp,), name='scoring-reload', daemon=True).start()
+        return True
+
+    def _reload(self, stamp):
+        """Charge la version du manifeste ; l'empreinte n'est retenue qu'après un chargement réussi
+        (copie partielle, pickle illisible : nouvel essai au contrôle suivant)"""
+        try:
+            loaded = self._load_from_registry()
+            if loaded is not None:
+                self._manifest_stamp = stamp
+                self._active = loaded
+                # Nouvelle version : l'instantané courant lui sera appliqué au prochain contrôle
+                self._snapshot_mtime = None
+                self._next_snapshot_check = 0.0
+                logger.info(f"Moteur de scoring: bascule vers {loaded.version}")
+        finally:
+            self._reload_lock.release()
+
+    def refresh_online_weights(self):
+        """Applique l'instantané des poids en ligne à la version active live s'il a changé"""
+        self._next_snapshot_check = time.monotonic() + self.check_interval
+        active = self._active
+        if active is None or active.fused is None:
+            return False
+        try:
+            mtime = os.stat(self.weights_snapshot_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._snapshot_mtime:
+            return False
+        # Un rechargement en cours remplacera la version active : l'instantané attendra le prochain contrôle
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            if active is not self._active:
+                return False
+            self._snapshot_mtime = mtime
+            snapshot = load_weights_snapshot(self.weights_snapshot_path)
+            if snapshot is None or snapshot['coef'].shape != active.fused[0].shape:
+                return False
+            # Instantané antérieur à la version chargée (génération plus ancienne, ou moins d'échantillons dans
+            # la même génération) : ignoré. Une reconstruction repart à t = 0 dans une génération plus récente.
+            if snapshot_stamp(snapshot) < model_stamp(active.model):
+                return False
+            updated = copy.copy(active)
+            updated.fused = fuse(snapshot['coef'], snapshot['intercept'], snapshot['mean'], snapshot['scale'])
+            updated.snapshot_samples = int(snapshot['t'])
+            self._active = updated
+            return True
+        finally:
+            self._reload_lock.release()
+
+    @staticmethod
+    def as_matrix(X):
+        """Convertit l'entrée en matrice float64 contiguë (n, 13)"""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != N_FEATURES:
+            raise ValueError(f"{N_FEATURES} features attendues, {X.shape[1]} reçues")
+        return X
+
+    @staticmethod
+    def scale(X, loaded):
+        """Applique la normalisation du scaler d'un LoadedModel"""
+        if loaded.mean is not None:
+            return (X - loaded.mean) / loaded.scale
+        return X
+
+    def score(self, X):
+        """Retourne la probabilité de fraude de chaque ligne de X"""
+        return self.score_versioned(X)[0]
+
+    def score_versioned(self, X):
+        """Retourne (probabilités, version du modèle qui les a calculées)
+
+        La version est celle lue avant le scoring : un rechargement concurrent ne
+        peut pas attribuer ces probabilités à la version suivante.
+        """
+        if self.registry is not None and time.monotonic() >= self._next_check:
+            self.check_for_update()
+        if self.weights_snapshot_path is not None and time.monotonic() >= self._next_snapshot_check:
+            self.refresh_online_weights()
+
+        # Une seule lecture de la référence : tout l'appel utilise la même version
+        active = self._active
+        if active is None:
+            raise RuntimeError("Aucun modèle disponible pour le scoring")
+
+        start = time.perf_counter()
+        X = self.as_matrix(X)
+        probabilities = self.score_loaded(active, X)
+        self._record_latency(time.perf_counter() - start, len(X))
+
+        # Observateurs hors chemin critique (shadow scoring, ...) : dépôt non bloquant
+        for listener in self.listeners:
+            listener.observe(X, probabilities, active.version, active.source)
+        return probabilities, active.version
+
+    def score_loaded(self, active, X):
+        """Probabilités d'un LoadedModel donné (cascade éventuelle), sans statistiques ni observateurs"""
+        if self.cascade_band and active.fast is not None and active.fast.fast_model is not active.model:
+            return active.fast.score(X, lambda rows: self._score_active(active, rows))
+        return self._score_active(active, X)
+
+    def _score_active(self, active, X):
+        """Probabilités du modèle actif (arbres compilés pour les petits lots)"""
+        if active.fused is not None:
+            return self._score_fused(active, X)
+        X_scaled = self.scale(X, active)
+        if active.compiled is not None and len(X_scaled) <= self.compiled_max_rows:
+            return active.compiled.predict_proba(X_scaled)[:, 1]
+        return active.model.predict_proba(X_scaled)[:, 1]
+
+    @staticmethod
+    def _score_fused(active, X):
+        """Régression logistique sur les poids fusionnés (équivalent au predict_proba de SGD log_loss)"""
+        weights, bias = active.fused
+        return 1.0 / (1.0 + np.exp(-np.clip(X @ weights + bias, -500, 500)))
+
+    def score_within(self, X, deadline_ms, submit=None):
+        """Score X en au plus deadline_ms ; retourne (probabilités, degraded, version).
+
+        version est celle du modèle qui a produit les probabilités (celle du repli pour
+        un score dégradé). submit(X) -> Future sur (probabilités, version) permet de
+        passer par le coalesceur ; par défaut le scoring
+        s'exécute dans un pool de deadline_workers threads du worker. Un appel en retard
+        est annulé s'il n'a pas encore démarré ; quand tous les threads sont occupés, le
+        repli est retourné sans soumettre l'appel. Lève ScoringTimeout si aucun score de
+        repli n'est disponible.
+        """
+        if not deadline_ms or deadline_ms <= 0:
+            probabilities, version = self.score_versioned(X)
+            return probabilities, False, version
+
+        X = self.as_matrix(X)
+        with self._lock:
+            self._n_deadline_calls += 1
+            saturated = submit is None and self._in_flight >= self.deadline_workers
+            if submit is None and not saturated:
+                self._in_flight += 1
+        if saturated:
+            with self._lock:
+                self._n_shed += 1
+            return self._degraded_score(X)
+
+        if submit is not None:
+            future = submit(X)
+        else:
+            future = self._get_executor().submit(self.score_versioned, X)
+            future.add_done_callback(self._release_slot)
+        try:
+            probabilities, version = future.result(timeout=deadline_ms / 1000.0)
+            return np.atleast_1d(probabilities), False, version
+        except FutureTimeout:
+            future.cancel()
+            return self._degraded_score(X)
+
+    def _release_slot(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _degraded_score(self, X):
+        """Score de repli marqué comme dégradé ; lève ScoringTimeout s'il n'y en a pas"""
+        probabilities, version = self.fallback_score(X)
+        if probabilities is None:
+            raise ScoringTimeout("Délai de scoring dépassé sans score de repli disponible")
+        with self._lock:
+            self._n_fallbacks += 1
+        return probabilities, True, version
+
+    def fallback_score(self, X):
+        """Score de repli: modèle linéaire de la version active, sinon self.fallback
+
+        Retourne (probabilités, version du repli) ou (None, None).
+        """
+        active = self._active
+        if active is not None and active.fused is not None:
+            return self._score_fused(active, X), f"{active.version}-linear"
+        if active is not None and active.fast is not None:
+            return active.fast.fast_score(X), f"{active.version}-linear"
+        if self.fallback is not None:
+            try:
+                return np.asarray(self.fallback(X), dtype=np.float64), self.fallback_version
+            except Exception as e:
+                logger.error(f"Erreur score de repli: {str(e)}")
+        return None, None
+
+    def _get_executor(self):
+        """Pool de threads créé paresseusement dans chaque processus (après un fork gunicorn)"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.deadline_workers,
+                                                        thread_name_prefix='scoring-deadline')
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def predict(self, X):
+        """Retourne (labels, probabilités de fraude) pour chaque ligne de X"""
+        probabilities = self.score(X)
+        return probabilities >= self.threshold, probabilities
+
+    def _record_latency(self, duration, n_rows):
+        with self._lock:
+            self._latencies[self._latency_pos % len(self._latencies)] = duration
+            self._latency_pos += 1
+            self._n_calls += 1
+            self._n_rows += n_rows
+
+    def get_stats(self):
+        """Statistiques de latence pour la supervision (en millisecondes)"""
+        with self._lock:
+            filled = min(self._latency_pos, len(self._latencies))
+            window = self._latencies[:filled].copy()
+            n_calls, n_rows = self._n_calls, self._n_rows
+            n_deadline_calls, n_fallbacks = self._n_deadline_calls, self._n_fallbacks
+            n_shed, in_flight = self._n_shed, self._in_flight
+        active = self._active
+
+        stats = {
+            'model': self.model_name,
+            'model_version': self.model_version,
+            'compiled': self.compiled is not None,
+            'calls': n_calls,
+            'rows': n_rows,
+            'deadline_calls': n_deadline_calls,
+            'deadline_fallbacks': n_fallbacks,
+            'fallback_rate': round(n_fallbacks / n_deadline_calls, 4) if n_deadline_calls else None,
+            'deadline_shed': n_shed,
+            'deadline_in_flight': in_flight,
+        }
+        if active is not None and active.fused is not None:
+            stats['online_weights'] = {'live': True, 'snapshot_samples': active.snapshot_samples}
+        if self.cascade_band and active is not None and active.fast is not None:
+            stats['cascade'] = active.fast.get_stats()
+        if filled:
+            p50, p95, p99 = np.percentile(window, [50, 95, 99]) * 1000
+            stats.update({
+                'latency_ms_mean': round(float(window.mean() * 1000), 4),
+                'latency_ms_p50': round(float(p50), 4),
+                'latency_ms_p95': round(float(p95), 4),
+                'latency_ms_p99': round(float(p99), 4),
+                'latency_ms_max': round(float(window.max() * 1000), 4),
+            })
+        return stats
@@ -0,0 +1,182 @@
+import numpy as np
+import logging
+import os
+import queue
+import threading
+import time
+from model.scoring_engine import LoadedModel, ScoringEngine
+from model.process_local import ProcessThread, write_process_summary, read_process_summaries
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowScorer:
+    """Scoring champion/challenger hors du chemin de requête.
+
+    Le moteur de scoring dépose (features, probabilités du champion) dans une file
+    sans jamais attendre, bornée en lignes (max_pending_rows : un lot de l'API ou un
+    morceau de fichier compte pour toutes ses lignes) ; un thread de fond regroupe les
+    lignes, score les challengers par lots et écrit <output_dir>/summary.<pid>.json :
+    taux de désaccord et statistiques d'écart (histogramme, sans conserver les valeurs).
+    """
+
+    # Histogramme fixe des écarts absolus, pour des quantiles sans conserver les valeurs
+    DELTA_BINS = np.linspace(0.0, 1.0, 101)
+
+    def __init__(self, challengers, output_dir='model/shadow', threshold=0.5,
+                 max_pending_rows=100000, flush_rows=1000, flush_interval=10.0):
+        self.challengers = challengers
+        self.output_dir = output_dir
+        self.threshold = threshold
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_rows = 0
+        self._thread = ProcessThread(self._run, 'shadow-scorer', on_start=self._reset_process)
+        self.dropped = 0
+        self.champion_version = None
+        self._reset_stats()
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    @classmethod
+    def from_registry(cls, registry, versions, **kwargs):
+        """Construit les challengers à partir de versions du registre"""
+        challengers = {}
+        for version in versions:
+            try:
+                model, scaler, meta = registry.load(version)
+                name = f"{meta.get('model_name', meta['name'])}-v{version}".replace(' ', '_')
+                challengers[name] = LoadedModel(model, scaler, version=name, registry_version=version)
+            except Exception as e:
+                logger.error(f"Challenger version {version} non chargé: {str(e)}")
+        return cls(challengers, **kwargs)
+
+    def _reset_stats(self):
+        self.stats = {
+            name: {
+                'rows': 0,
+                'disagreements': 0,
+                'sum_delta': 0.0,
+                'sum_abs_delta': 0.0,
+                'max_abs_delta': 0.0,
+                'abs_delta_hist': np.zeros(len(self.DELTA_BINS) - 1, dtype=np.int64),
+                'seconds': 0.0
+            }
+            for name in self.challengers
+        }
+
+    def _reset_process(self):
+        self._queue = queue.Queue()
+        self._pending_rows = 0
+
+    def observe(self, X, probabilities, champion_version=None, champion_source=None):
+        """Dépose un lot scoré par le champion ; abandonne le lot si trop de lignes sont en attente"""
+        if not self.challengers:
+            return
+        self._thread.ensure_started()
+        with self._lock:
+            if self._pending_rows + len(X) > self.max_pending_rows:
+                self.dropped += len(X)
+                return
+            self._pending_rows += len(X)
+        self._queue.put_nowait((X, probabilities, champion_version))
+
+    def _run(self):
+        pending_X, pending_p, pending_rows = [], [], 0
+        next_flush = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                X, probabilities, champion_version = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+                with self._lock:
+                    self._pending_rows -= len(X)
+                if champion_version != self.champion_version:
+                    # Nouveau champion : les statistiques précédentes ne sont plus comparables
+                    if pending_rows:
+                        self._score_batch(np.vstack(pending_X), np.concatenate(pending_p))
+                        pending_X, pending_p, pending_rows = [], [], 0
+                    self.champion_version = champion_version
+                    self._reset_stats()
+                pending_X.append(X)
+                pending_p.append(probabilities)
+                pending_rows += len(X)
+            except queue.Empty:
+                pass
+
+            if pending_rows >= self.flush_rows or (pending_rows and time.monotonic() >= next_flush):
+                try:
+                    self._score_batch(np.vstack(pending_X), np.concatenate(pending_p))
+                except Exception as e:
+                    logger.error(f"Erreur shadow scoring: {str(e)}")
+                pending_X, pending_p, pending_rows = [], [], 0
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+
+    def _score_batch(self, X, champion):
+        """Score un lot avec chaque challenger et met à jour les statistiques"""
+        champion_label = champion >= self.threshold
+
+        for name, challenger in self.challengers.items():
+            start = time.perf_counter()
+            proba = challenger.model.predict_proba(ScoringEngine.scale(X, challenger))[:, 1]
+            delta = (proba - champion).astype(np.float32)
+            abs_delta = np.abs(delta)
+
+            stats = self.stats[name]
+            stats['rows'] += len(X)
+            stats['disagreements'] += int(np.count_nonzero((proba >= self.threshold) != champion_label))
+            stats['sum_delta'] += float(delta.sum())
+            stats['sum_abs_delta'] += float(abs_delta.sum())
+            stats['max_abs_delta'] = max(stats['max_abs_delta'], float(abs_delta.max()))
+            stats['abs_delta_hist'] += np.histogram(abs_delta, bins=self.DELTA_BINS)[0]
+            stats['seconds'] += time.perf_counter() - start
+
+        self._write_summary()
+
+    def _write_summary(self):
+        write_process_summary(self.output_dir, {
+            'pid': os.getpid(),
+            'champion_version': self.champion_version,
+            'dropped_rows': self.dropped,
+            'updated_at': time.time(),
+            'challengers': {
+                name: {**stats, 'abs_delta_hist': stats['abs_delta_hist'].tolist()}
+                for name, stats in self.stats.items()
+            }
+        })
+
+    @classmethod
+    def merged_report(cls, output_dir='model/shadow'):
+        """Fusionne les résumés de tous les workers pour le champion le plus récent"""
+        champion, summaries = read_process_summaries(output_dir, 'champion_version')
+        if not summaries:
+            return {'champion_version': None, 'challengers': {}}
+
+        merged = {}
+        for summary in summaries:
+            for name, stats in summary['challengers'].items():
+                total = merged.setdefault(name, {
+                    'rows': 0, 'disagreements': 0, 'sum_delta': 0.0, 'sum_abs_delta': 0.0,
+                    'max_abs_delta': 0.0, 'abs_delta_hist': np.zeros(len(cls.DELTA_BINS) - 1)
+                })
+                for key in ('rows', 'disagreements', 'sum_delta', 'sum_abs_delta'):
+                    total[key] += stats[key]
+                total['max_abs_delta'] = max(total['max_abs_delta'], stats['max_abs_delta'])
+                total['abs_delta_hist'] += np.asarray(stats['abs_delta_hist'])
+
+        report = {}
+        for name, total in merged.items():
+            rows = total['rows']
+            cumulative = np.cumsum(total['abs_delta_hist'])
+            p95_index = int(np.searchsorted(cumulative, 0.95 * cumulative[-1])) if rows else 0
+            report[name] = {
+                'rows': rows,
+                'disagreement_rate': round(total['disagreements'] / rows, 6) if rows else None,
+                'mean_delta': round(total['sum_delta'] / rows, 6) if rows else None,
+                'mean_abs_delta': round(total['sum_abs_delta'] / rows, 6) if rows else None,
+                'p95_abs_delta': round(float(cls.DELTA_BINS[p95_index + 1]), 4) if rows else None,
+                'max_abs_delta': round(total['max_abs_delta'], 6)
+            }
+        return {'champion_version': champion, 'challengers': report}
@@ -16,6 +16,10 @@ import json
 import os
 import sys
 from datetime import datetime
+from tree_compiler import compile_ensemble, check_parity
+from model_registry import ModelRegistry
+from cascade_scorer import CascadeScorer
+from drift_reference import build_reference, save_reference
 
 class FraudDetectionModel:
     def __init__(self):
@@ -27,6 +31,8 @@ class FraudDetectionModel:
             'XGBoost': XGBClassifier(random_state=42, eval_metric='logloss')
         }
         self.best_model = None
+        self.compiled_model = None
+        self.cascade_report = None
         self.scaler = StandardScaler()
         self.results = {}
         self.training_history = {}
@@ -272,6 +278,110 @@ class FraudDetectionModel:
         joblib.dump(self.scaler, 'model/scaler.pkl')
         print("✅ Scaler sauvegardé")
     
+    def export_compiled_model(self, X_check):
+        """Export du meilleur ensemble d'arbres en tableaux NumPy plats + contrôle de parité"""
+        print("\n🧩 Compilation du modèle pour l'inférence rapide...")
+        
+        forest = compile_ensemble(self.best_model) if self.best_model is not None else None
+        if forest is None:
+            print("ℹ️  Modèle non compilable (pas un ensemble d'arbres) - inférence native conservée")
+            return False
+        
+        max_diff, ok = check_parity(self.best_model, forest, X_check)
+        if not ok:
+            print(f"❌ Parité non respectée (écart max {max_diff:.2e}) - export annulé")
+            return False
+        
+        forest.save('model/best_model_compiled')
+        self.compiled_model = forest
+        print(f"✅ {forest.n_trees} arbres compilés ({len(forest.feature)} noeuds, profondeur {forest.max_depth})")
+        print(f"✅ Parité vérifiée sur {len(X_check)} lignes (écart max {max_diff:.2e})")
+        return True
+    
+    def publish_model(self):
+        """Publication du meilleur modèle (activé) et des autres candidats (challengers) dans le registre"""
+        if self.best_model is None:
+            return None
+        
+        registry = ModelRegistry()
+        training_run = datetime.now().strftime('%Y%m%d%H%M%S')
+        best_model_name = self.select_best_model()
+        
+        version = None
+        for name, result in self.results.items():
+            metadata = {
+                'model_name': name,
+                'training_run': training_run,
+                'accuracy': float(result['accuracy']),
+                'precision': float(result['precision']),
+                'recall': float(result['recall']),
+                'f1_score': float(result['f1_score'])
+            }
+            if name == best_model_name:
+                version = registry.publish(self.best_model, self.scaler, source='training',
+                                           compiled=self.compiled_model, metadata=metadata)
+                print(f"✅ Version {version} ({name}) publiée et activée dans model/registry/")
+            else:
+                challenger = registry.publish(result['model'], self.scaler, source='challenger',
+                                              metadata=metadata, activate=False)
+                print(f"✅ Challenger {name} publié (version {challenger})")
+        return version
+    
+    def save_drift_reference(self, X_train, X_test):
+        """Instantané des distributions d'entraînement (features) et des probabilités hors échantillon pour le suivi de dérive"""
+        if self.best_model is None:
+            return None
+        
+        probabilities = self.best_model.predict_proba(self.scaler.transform(X_test))[:, 1]
+        reference = build_reference(X_train, probabilities)
+        path = os.path.join(ModelRegistry().root, 'drift_reference.json')
+        save_reference(reference, path)
+        print(f"✅ Référence de dérive sauvegardée: {path} ({len(X_train)} lignes, {len(probabilities)} probabilités)")
+        return reference
+    
+    def evaluate_cascade(self, X_test, y_test, bands=((0.1, 0.9), (0.05, 0.95), (0.02, 0.98))):
+        """Évaluation du scoring en cascade (régression logistique puis meilleur modèle) contre le meilleur modèle seul"""
+        print("\n🪜 Évaluation du scoring en cascade...")
+        
+        fast = self.results.get('Logistic Regression', {}).get('model')
+        if fast is None or self.best_model is None or self.best_model is fast:
+            print("ℹ️  Cascade non applicable (pas de pré-filtre linéaire distinct du meilleur modèle)")
+            return None
+        
+        X = np.ascontiguousarray(X_test, dtype=np.float64)
+        y = np.asarray(y_test)
+        heavy_score = lambda rows: self.best_model.predict_proba((rows - self.scaler.mean_) / self.scaler.scale_)[:, 1]
+        
+        start = datetime.now()
+        heavy_proba = heavy_score(X)
+        heavy_seconds = max((datetime.now() - start).total_seconds(), 1e-9)
+        heavy_pred = heavy_proba >= 0.5
+        heavy_recall = recall_score(y, heavy_pred, zero_division=0)
+        print(f"  Modèle lourd seul: {len(X) / heavy_seconds:,.0f} lignes/s, recall fraude {heavy_recall:.4f}")
+        
+        report = {'heavy_rows_per_s': len(X) / heavy_seconds, 'heavy_recall': float(heavy_recall), 'bands': []}
+        for low, high in bands:
+            cascade = CascadeScorer(fast, self.scaler, low, high)
+            start = datetime.now()
+            proba = cascade.score(X, heavy_score)
+            seconds = max((datetime.now() - start).total_seconds(), 1e-9)
+            pred = proba >= 0.5
+            result = {
+                'band': [low, high],
+                'escalation_rate': cascade.escalated / len(X),
+                'rows_per_s': len(X) / seconds,
+                'speedup': heavy_seconds / seconds,
+                'recall': float(recall_score(y, pred, zero_division=0)),
+                'agreement': float(np.mean(pred == heavy_pred))
+            }
+            report['bands'].append(result)
+            print(f"  Bande [{low}, {high}]: {result['escalation_rate']:.1%} escaladées, "
+                  f"{result['rows_per_s']:,.0f} lignes/s (x{result['speedup']:.1f}), "
+                  f"recall {result['recall']:.4f}, accord {result['agreement']:.2%}")
+        
+        self.cascade_report = report
+        return report
+    
     def generate_plots(self):
         """Génération des visualisations"""
         print("\n📈 Génération des graphiques...")
@@ -441,6 +551,10 @@ def main():
         model.train_models(X_train, X_test, y_train, y_test)
         best_model = model.select_best_model()
         model.save_models()
+        model.export_compiled_model(model.scaler.transform(X_test))
+        model.publish_model()
+        model.save_drift_reference(X_train, X_test)
+        model.evaluate_cascade(X_test, y_test)
         model.generate_plots()
         
         detailed_results = {}
@@ -0,0 +1,226 @@
+import numpy as np
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForest:
+    """Ensemble d'arbres compilé en tableaux NumPy plats.
+
+    Tous les noeuds de tous les arbres sont concaténés ; une feuille pointe
+    vers elle-même (left == right == index), ce qui permet de parcourir tous
+    les arbres en parallèle pendant max_depth itérations vectorisées.
+
+    kind='mean'  : probabilité = moyenne des feuilles (RandomForest)
+    kind='logit' : probabilité = sigmoid(offset + somme des feuilles) (GradientBoosting, XGBoost)
+    """
+
+    ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'default_left', 'roots']
+
+    def __init__(self, feature, threshold, left, right, value, default_left, roots,
+                 kind='mean', offset=0.0, strict=False, max_depth=0, n_features=0):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.default_left = default_left
+        self.roots = roots
+        self.kind = kind
+        self.offset = float(offset)
+        self.strict = bool(strict)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _leaf_indices(self, X):
+        """Retourne l'indice de feuille atteint dans chaque arbre, forme (n, n_trees)"""
+        n, n_features = X.shape
+        idx = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        # Indexation à plat dans X : plus rapide que l'indexation 2-D avancée
+        flat = X.ravel()
+        row_base = (np.arange(n, dtype=np.int64) * n_features)[:, None]
+        has_missing = np.isnan(flat).any()
+
+        for _ in range(self.max_depth):
+            values = flat[row_base + self.feature[idx]]
+            if self.strict:
+                go_left = values < self.threshold[idx]
+            else:
+                go_left = values <= self.threshold[idx]
+            if has_missing:
+                go_left = np.where(np.isnan(values), self.default_left[idx], go_left)
+            idx = np.where(go_left, self.left[idx], self.right[idx])
+        return idx
+
+    def decision_function(self, X, block_rows=4096):
+        """Agrégat brut des feuilles (moyenne ou marge selon kind)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        out = np.empty(X.shape[0], dtype=np.float64)
+        # Traitement par blocs pour borner la mémoire des matrices (n, n_trees)
+        for start in range(0, X.shape[0], block_rows):
+            leaves = self.value[self._leaf_indices(X[start:start + block_rows])]
+            if self.kind == 'mean':
+                out[start:start + block_rows] = leaves.mean(axis=1)
+            else:
+                out[start:start + block_rows] = leaves.sum(axis=1) + self.offset
+        return out
+
+    def predict_proba(self, X):
+        """Même contrat que sklearn : matrice (n, 2) [P(non fraude), P(fraude)]"""
+        raw = self.decision_function(X)
+        if self.kind == 'logit':
+            proba = 1.0 / (1.0 + np.exp(-raw))
+        else:
+            proba = raw
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+    def save(self, path):
+        """Exporte chaque tableau en .npy brut dans le répertoire path (mappable en mémoire)"""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            'kind': self.kind, 'offset': self.offset, 'strict': self.strict,
+            'max_depth': self.max_depth, 'n_features': self.n_features
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Charge un modèle exporté ; avec mmap_mode='r' les pages sont partagées entre processus"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in cls.ARRAYS
+        }
+        return cls(**arrays, **meta)
+
+
+def _concat_trees(trees):
+    """Concatène une liste d'arbres (feature, threshold, left, right, value, default_left, depth)"""
+    offsets = np.cumsum([0] + [len(tree[0]) for tree in trees[:-1]])
+    feature, threshold, left, right, value, default_left = ([] for _ in range(6))
+
+    for offset, (f, t, l, r, v, d, _) in zip(offsets, trees):
+        is_leaf = l < 0
+        own = np.arange(len(f))
+        feature.append(np.where(is_leaf, 0, f))
+        threshold.append(np.where(is_leaf, 0.0, t))
+        left.append(np.where(is_leaf, own, l) + offset)
+        right.append(np.where(is_leaf, own, r) + offset)
+        value.append(v)
+        default_left.append(d)
+
+    return dict(
+        feature=np.concatenate(feature).astype(np.int32),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        value=np.concatenate(value).astype(np.float64),
+        default_left=np.concatenate(default_left).astype(bool),
+        roots=offsets.astype(np.int32),
+    ), max(tree[6] for tree in trees)
+
+
+def _sklearn_tree(tree, leaf_value):
+    return (tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            leaf_value, np.ones(tree.node_count, dtype=bool), tree.max_depth)
+
+
+def _compile_random_forest(model):
+    trees = []
+    for estimator in model.estimators_:
+        counts = estimator.tree_.value[:, 0, :]
+        fraction = counts[:, 1] / np.maximum(counts.sum(axis=1), 1e-12)
+        trees.append(_sklearn_tree(estimator.tree_, fraction))
+    arrays, depth = _concat_trees(trees)
+    return CompiledForest(**arrays, kind='mean', max_depth=depth, n_features=model.n_features_in_)
+
+
+def _compile_gradient_boosting(model):
+    if model.estimators_.shape[1] != 1:
+        raise ValueError("Seule la classification binaire est supportée")
+    trees = [
+        _sklearn_tree(estimator.tree_, estimator.tree_.value[:, 0, 0] * model.learning_rate)
+        for estimator in model.estimators_[:, 0]
+    ]
+    arrays, depth = _concat_trees(trees)
+    forest = CompiledForest(**arrays, kind='logit', max_depth=depth, n_features=model.n_features_in_)
+    # Le prédicteur initial (prior) est constant : on le recale sur une ligne de référence
+    reference = np.zeros((1, model.n_features_in_))
+    forest.offset = float(model.decision_function(reference)[0] - forest.decision_function(reference)[0])
+    return forest
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster()
+    n_features = booster.num_features()
+    trees = []
+
+    for dump in booster.get_dump(dump_format='json'):
+        nodes = {}
+        stack = [(json.loads(dump), 0)]
+        while stack:
+            node, depth = stack.pop()
+            nodes[node['nodeid']] = (node, depth)
+            stack.extend((child, depth + 1) for child in node.get('children', []))
+
+        size = max(nodes) + 1
+        f = np.zeros(size, dtype=np.int64)
+        t = np.zeros(size)
+        l = np.full(size, -1, dtype=np.int64)
+        r = np.full(size, -1, dtype=np.int64)
+        v = np.zeros(size)
+        d = np.ones(size, dtype=bool)
+        for node_id, (node, _) in nodes.items():
+            if 'leaf' in node:
+                v[node_id] = node['leaf']
+                continue
+            f[node_id] = int(str(node['split']).lstrip('f'))
+            t[node_id] = np.float32(node['split_condition'])
+            l[node_id], r[node_id] = node['yes'], node['no']
+            d[node_id] = node['missing'] == node['yes']
+        trees.append((f, t, l, r, v, d, max(depth for _, depth in nodes.values())))
+
+    arrays, depth = _concat_trees(trees)
+    forest = CompiledForest(**arrays, kind='logit', strict=True, max_depth=depth, n_features=n_features)
+    reference = np.zeros((1, n_features), dtype=np.float32)
+    forest.offset = float(model.predict(reference, output_margin=True)[0] - forest.decision_function(reference)[0])
+    return forest
+
+
+def compile_ensemble(model):
+    """Compile un ensemble d'arbres entraîné ; retourne None si le modèle n'est pas supporté"""
+    name = type(model).__name__
+    try:
+        if name == 'RandomForestClassifier':
+            return _compile_random_forest(model)
+        if name == 'GradientBoostingClassifier':
+            return _compile_gradient_boosting(model)
+        if name == 'XGBClassifier':
+            return _compile_xgboost(model)
+    except Exception as e:
+        logger.error(f"Erreur compilation {name}: {str(e)}")
+    return None
+
+
+def check_parity(model, forest, X, tolerance=1e-6):
+    """Écart maximal entre predict_proba natif et compilé sur X"""
+    native = model.predict_proba(X)[:, 1]
+    compiled = forest.predict_proba(X)[:, 1]
+    max_diff = float(np.max(np.abs(native - compiled)))
+    return max_diff, max_diff <= tolerance
@@ -0,0 +1,51 @@
+import numpy as np
+import os
+
+# Disposition de l'instantané des poids en ligne : scalaires puis vecteurs de N_FEATURES valeurs (float64 bruts)
+# generation identifie la lignée des poids : un modèle réinitialisé ou reconstruit repart à t = 0
+# avec une génération plus récente, qui l'emporte sur un nombre d'échantillons plus élevé
+SNAPSHOT_SCALARS = ('generation', 't', 'intercept', 'n_samples_seen', 'published_at')
+SNAPSHOT_VECTORS = ('coef', 'mean', 'scale', 'var')
+
+
+def write_weights_snapshot(path, state):
+    """Remplace atomiquement l'instantané par state (tableau float64 dans l'ordre SNAPSHOT_SCALARS, SNAPSHOT_VECTORS)"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    state.tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_weights_snapshot(path):
+    """Instantané publié par l'apprenant (dict nom -> valeur), ou None s'il est absent ou tronqué"""
+    try:
+        data = np.fromfile(path, dtype=np.float64)
+    except OSError:
+        return None
+    n_scalars = len(SNAPSHOT_SCALARS)
+    n_features = (len(data) - n_scalars) // len(SNAPSHOT_VECTORS)
+    if n_features <= 0 or len(data) != n_scalars + n_features * len(SNAPSHOT_VECTORS):
+        return None
+    snapshot = dict(zip(SNAPSHOT_SCALARS, data[:n_scalars]))
+    for index, name in enumerate(SNAPSHOT_VECTORS):
+        start = n_scalars + index * n_features
+        snapshot[name] = data[start:start + n_features]
+    return snapshot
+
+
+def model_stamp(model):
+    """(génération, échantillons vus) d'un SGDClassifier ; (0, 0) pour un modèle antérieur aux générations"""
+    return float(getattr(model, 'generation_', 0.0)), float(getattr(model, 't_', 0.0))
+
+
+def snapshot_stamp(snapshot):
+    """(génération, échantillons vus) d'un instantané, comparable à model_stamp"""
+    return float(snapshot['generation']), float(snapshot['t'])
+
+
+def fuse(coef, intercept, mean, scale):
+    """Replie la normalisation du scaler dans les coefficients d'un modèle linéaire
+
+    ((x - mean) / scale) . coef + intercept  ==  x . (coef / scale) + (intercept - mean . coef / scale)
+    """
+    weights = np.asarray(coef, dtype=np.float64) / scale
+    return weights, float(intercept) - float(np.dot(mean, weights))
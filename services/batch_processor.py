@@ -0,0 +1,431 @@
+import numpy as np
+import pandas as pd
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from services.batch_schema import BatchSchema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Formats d'entrée acceptés (extension -> format) ; parquet et arrow nécessitent pyarrow
+INPUT_FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow'
+}
+
+
+def input_format(filename):
+    """Format d'un fichier de lot d'après son extension (None si non supporté)"""
+    return INPUT_FORMATS.get(os.path.splitext(filename.lower())[1])
+
+RESULT_SCHEMA = {
+    'transaction_id': 'int64',
+    'amount': 'float64',
+    'fraud_probability': 'float32',
+    'is_fraud': 'int8'
+}
+
+
+def result_records(columns):
+    """Convertit un bloc de résultats colonnaires en lignes pour l'affichage"""
+    is_fraud = columns['is_fraud'].astype(bool)
+    probabilities = columns['fraud_probability'].astype(np.float64)
+    confidences = np.where(is_fraud, probabilities, 1 - probabilities)
+    return [
+        {
+            'transaction_id': int(transaction_id),
+            'amount': float(amount),
+            'prediction': 'Fraude' if fraud else 'Sécurisé',
+            'confidence': float(confidence)
+        }
+        for transaction_id, amount, fraud, confidence in zip(columns['transaction_id'], columns['amount'], is_fraud, confidences)
+    ]
+
+
+def unique_rows(features):
+    """Regroupe les lignes identiques d'une matrice de features
+
+    Retourne (indice de la première occurrence de chaque ligne distincte, inverse),
+    avec features[first][inverse] == features, ou None si le morceau n'a aucun doublon.
+    Chaque ligne est hachée en une passe vectorisée ; l'égalité des lignes regroupées
+    est vérifiée ensuite, une collision de hachage désactive la déduplication du morceau.
+    """
+    if len(features) < 2:
+        return None
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(features, copy=False), index=False).to_numpy()
+    inverse, uniques = pd.factorize(hashes)
+    if len(uniques) == len(features):
+        return None
+    first = np.empty(len(uniques), dtype=np.int64)
+    # Affectation en ordre inverse : la dernière écriture est la première occurrence
+    first[inverse[::-1]] = np.arange(len(features) - 1, -1, -1)
+    if not np.array_equal(features[first][inverse], features):
+        logger.warning("Collision de hachage: morceau scoré sans déduplication")
+        return None
+    return first, inverse
+
+
+class BatchProcessor:
+    """Scoring par lots d'un fichier CSV, Parquet ou Arrow IPC en flux.
+
+    Le fichier est lu par morceaux de chunk_size lignes ; chaque morceau est scoré
+    en un seul appel vectorisé puis ajouté au stockage colonnaire des résultats.
+    La mémoire reste bornée par la taille d'un morceau, quelle que soit la taille du fichier.
+
+    Les lignes identiques d'un morceau (transactions répétées ou renvoyées) ne sont
+    scorées qu'une fois ; le résultat est recopié sur chaque ligne d'origine.
+
+    Après chaque morceau, un point de contrôle (lignes lues, position en octets dans le CSV,
+    lignes de résultats validées, taille du fichier de rejets) est écrit atomiquement dans
+    le répertoire des résultats ; un traitement relancé revient à cet état et reprend au
+    morceau suivant.
+    """
+
+    CHECKPOINT = 'checkpoint.json'
+    CSV_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, scoring_engine, upload_dir='uploads', chunk_size=50000, dedupe=True):
+        self.scoring_engine = scoring_engine
+        self.upload_dir = upload_dir
+        self.chunk_size = chunk_size
+        self.dedupe = dedupe
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    def save_upload(self, file, name=None):
+        """Enregistre le fichier téléversé sur disque (copie par blocs) et retourne son chemin"""
+        extension = os.path.splitext(file.filename.lower())[1] or '.csv'
+        path = os.path.join(self.upload_dir, f'batch_{name or uuid.uuid4().hex}{extension}')
+        file.save(path)
+        return path
+
+    def results_path(self, name):
+        return os.path.join(self.upload_dir, f'batch_{name}_results')
+
+    @staticmethod
+    def _require_pyarrow(path):
+        if pa is None:
+            raise ValueError(f"pyarrow est requis pour lire {os.path.basename(path)}")
+
+    def count_rows(self, path):
+        """Nombre de lignes de données (métadonnées pour Parquet/Arrow, sans parser pour un CSV)"""
+        file_format = input_format(path)
+        if file_format == 'parquet':
+            self._require_pyarrow(path)
+            return pq.ParquetFile(path).metadata.num_rows
+        if file_format == 'arrow':
+            self._require_pyarrow(path)
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        return self.count_csv_rows(path)
+
+    @staticmethod
+    def record_ends(block, quoted=False):
+        """Positions des fins d'enregistrement d'un bloc CSV : retours à la ligne hors guillemets
+
+        quoted indique si le bloc commence dans un champ entre guillemets ; retourne
+        (positions, quoted en fin de bloc). La parité du nombre de guillemets suffit,
+        y compris pour les guillemets doublés ("") à l'intérieur d'un champ.
+        """
+        data = np.frombuffer(block, dtype=np.uint8)
+        newlines = data == ord('\n')
+        quotes = data == ord('"')
+        if not quoted and not quotes.any():
+            return np.flatnonzero(newlines), False
+        # Compteur sur 8 bits : le débordement (modulo 256) conserve la parité
+        inside = (np.cumsum(quotes, dtype=np.uint8) + quoted) & 1
+        return np.flatnonzero(newlines & (inside == 0)), bool(inside[-1])
+
+    @classmethod
+    def count_csv_rows(cls, path):
+        """Compte les enregistrements de données d'un CSV sans le parser (blocs de 1 Mo)"""
+        records, quoted, last = 0, False, b'\n'
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(cls.CSV_BLOCK_SIZE)
+                if not block:
+                    break
+                ends, quoted = cls.record_ends(block, quoted)
+                records += len(ends)
+                last = block[-1:]
+        if last != b'\n':
+            records += 1
+        return max(0, records - 1)
+
+    def rejects_path(self, name):
+        return os.path.join(self.upload_dir, f'batch_{name}_rejects.csv')
+
+    def score_chunk(self, features, transaction_ids, amounts, scorer=None, groups=None):
+        """Score les lignes valides d'un morceau (via scorer.score si fourni, ex. ParallelScorer)
+
+        groups: résultat de unique_rows(features) ; seules les lignes distinctes sont alors scorées.
+        """
+        if groups is None:
+            probabilities = (scorer or self.scoring_engine).score(features)
+        else:
+            first, inverse = groups
+            probabilities = (scorer or self.scoring_engine).score(features[first])[inverse]
+        return {
+            'transaction_id': transaction_ids,
+            'amount': amounts,
+            'fraud_probability': probabilities,
+            'is_fraud': probabilities >= self.scoring_engine.threshold
+        }
+
+    @staticmethod
+    def write_rejects(path, df, valid, reasons, transaction_ids, header):
+        """Ajoute les lignes rejetées (valeurs d'origine + motif) au fichier de rejets"""
+        rejected = ~valid
+        rejects = df[rejected].copy()
+        rejects.insert(0, 'transaction_id', transaction_ids[rejected])
+        rejects.insert(1, 'reject_reason', [reason.rstrip('; ') for reason in reasons[rejected]])
+        rejects.to_csv(path, mode='a', header=header, index=False)
+
+    @classmethod
+    def skip_records(cls, f, count):
+        """Position en octets après les count premiers enregistrements de f (binaire, lu depuis le début)"""
+        f.seek(0)
+        offset, quoted = 0, False
+        while count:
+            block = f.read(cls.CSV_BLOCK_SIZE)
+            if not block:
+                break
+            ends, quoted = cls.record_ends(block, quoted)
+            if len(ends) >= count:
+                return offset + int(ends[count - 1]) + 1
+            count -= len(ends)
+            offset += len(block)
+        # Moins de count enregistrements complets : fin du fichier
+        return f.seek(0, os.SEEK_END)
+
+    def read_header(self, path):
+        """Noms des colonnes du fichier, sans lire les données"""
+        file_format = input_format(path)
+        if file_format == 'parquet':
+            self._require_pyarrow(path)
+            return pq.ParquetFile(path).schema_arrow.names
+        if file_format == 'arrow':
+            self._require_pyarrow(path)
+            with pa.memory_map(path) as source:
+                return pa.ipc.open_file(source).schema.names
+        return list(pd.read_csv(path, nrows=0).columns)
+
+    def iter_chunks(self, path, columns, start_row=0, start_offset=None):
+        """Morceaux (DataFrame, position) de chunk_size lignes à partir de start_row, limités aux colonnes utiles
+
+        Pour un CSV, position est l'octet qui suit le morceau et start_offset (s'il est
+        connu) remplace start_row pour la reprise ; None pour Parquet et Arrow.
+        """
+        file_format = input_format(path)
+        if file_format == 'parquet':
+            for chunk in self._iter_parquet(path, columns, start_row):
+                yield chunk, None
+        elif file_format == 'arrow':
+            for chunk in self._iter_arrow(path, columns, start_row):
+                yield chunk, None
+        else:
+            yield from self._iter_csv(path, columns, start_row, start_offset)
+
+    def _iter_csv(self, path, columns, start_row, start_offset):
+        """Découpe le fichier en enregistrements (record_ends) avant de parser chaque morceau
+
+        La position de reprise est ainsi exacte même avec des champs entre guillemets sur
+        plusieurs lignes ; les lignes vides sont conservées (skip_blank_lines=False) et
+        rejetées par le schéma, si bien que chaque ligne du fichier a un numéro de transaction.
+        """
+        header = self.read_header(path)
+        with open(path, 'rb') as f:
+            offset = start_offset if start_offset is not None else self.skip_records(f, start_row + 1)
+            f.seek(offset)
+            buffer, ends, quoted = bytearray(), np.empty(0, dtype=np.int64), False
+            while True:
+                block = f.read(self.CSV_BLOCK_SIZE)
+                if block:
+                    block_ends, quoted = self.record_ends(block, quoted)
+                    ends = np.concatenate([ends, block_ends + len(buffer)])
+                    buffer += block
+                elif len(buffer) > (int(ends[-1]) + 1 if len(ends) else 0):
+                    # Dernier enregistrement sans retour à la ligne final
+                    ends = np.append(ends, len(buffer) - 1)
+                while len(ends) >= self.chunk_size or (not block and len(ends)):
+                    n_records = min(self.chunk_size, len(ends))
+                    cut = int(ends[n_records - 1]) + 1
+                    data = bytes(buffer[:cut])
+                    if data.strip():
+                        chunk = pd.read_csv(io.BytesIO(data), header=None, names=header, usecols=columns,
+                                            skip_blank_lines=False)
+                    else:
+                        # Morceau fait uniquement de lignes vides : pandas n'y trouve aucune colonne
+                        chunk = pd.DataFrame(np.nan, index=range(n_records), columns=columns)
+                    offset += cut
+                    yield chunk, offset
+                    del buffer[:cut]
+                    ends = ends[n_records:] - cut
+                if not block:
+                    return
+
+    def _iter_parquet(self, path, columns, start_row):
+        """Lecture par colonnes et par row group : seuls les row groups restants sont ouverts"""
+        parquet_file = pq.ParquetFile(path)
+        row_groups, offset = [], 0
+        for index in range(parquet_file.metadata.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(index).num_rows
+            if offset + num_rows > start_row:
+                row_groups.append(index)
+            else:
+                offset += num_rows
+        if not row_groups:
+            return
+        batches = parquet_file.iter_batches(batch_size=self.chunk_size, row_groups=row_groups, columns=columns)
+        yield from self._rechunk(batches, start_row - offset)
+
+    def _iter_arrow(self, path, columns, start_row):
+        """Fichier Arrow IPC mappé en mémoire : les record batches sont lus sans copie"""
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i).select(columns) for i in range(reader.num_record_batches))
+            yield from self._rechunk(batches, start_row)
+
+    def _rechunk(self, batches, skip):
+        """Regroupe des record batches en DataFrames de chunk_size lignes, après avoir sauté skip lignes"""
+        pending, pending_rows = [], 0
+        for batch in batches:
+            if skip:
+                if batch.num_rows <= skip:
+                    skip -= batch.num_rows
+                    continue
+                batch, skip = batch.slice(skip), 0
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= self.chunk_size:
+                table = pa.Table.from_batches(pending)
+                yield table.slice(0, self.chunk_size).to_pandas()
+                rest = table.slice(self.chunk_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows:
+            yield pa.Table.from_batches(pending).to_pandas()
+
+    def load_checkpoint(self, store):
+        """Dernier point de contrôle d'un traitement (None si aucun)"""
+        try:
+            with open(os.path.join(store.path, self.CHECKPOINT)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_checkpoint(self, store, state):
+        path = os.path.join(store.path, self.CHECKPOINT)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    def process_file(self, input_path, store, progress=None, scorer=None, rejects_path=None):
+        """Score tout le fichier (CSV, Parquet ou Arrow IPC) dans store ; progress(lignes, fraudes, rejets, secondes)
+        est appelé après chaque morceau
+
+        Les lignes invalides ne sont pas scorées : elles sont écrites dans rejects_path
+        avec leur motif. Le schéma est établi une seule fois à partir de l'en-tête et
+        seules les colonnes qu'il référence sont lues.
+        Si un point de contrôle existe, le traitement reprend à partir de celui-ci.
+        """
+        schema = BatchSchema.from_header(self.read_header(input_path))
+
+        state = self.load_checkpoint(store) or {
+            'rows': 0, 'results_rows': 0, 'rejects_bytes': 0, 'frauds': 0, 'rejected': 0, 'seconds': 0.0,
+            'duplicates': 0, 'seconds_saved': 0.0
+        }
+        # Retour exact à l'état du point de contrôle : les écritures postérieures sont écartées
+        store.truncate(state['results_rows'])
+        if rejects_path and os.path.exists(rejects_path):
+            with open(rejects_path, 'r+b') as f:
+                f.truncate(state['rejects_bytes'])
+        if state['rows']:
+            logger.info(f"Reprise du lot à la ligne {state['rows'] + 1} ({state['results_rows']} résultats conservés)")
+
+        resumed_from = state['rows']
+        rows, frauds, rejected, results_rows = state['rows'], state['frauds'], state['rejected'], state['results_rows']
+        duplicates, seconds_saved = state.get('duplicates', 0), state.get('seconds_saved', 0.0)
+        validation_seconds = scoring_seconds = dedupe_seconds = 0.0
+        start = time.perf_counter()
+
+        for chunk, offset in self.iter_chunks(input_path, schema.columns, rows, state.get('offset')):
+            transaction_ids = np.arange(rows + 1, rows + 1 + len(chunk))
+
+            step = time.perf_counter()
+            features, valid, reasons = schema.validate(chunk)
+            n_rejected = len(chunk) - len(features)
+            if n_rejected and rejects_path:
+                header_needed = not os.path.exists(rejects_path) or os.path.getsize(rejects_path) == 0
+                self.write_rejects(rejects_path, chunk, valid, reasons, transaction_ids, header=header_needed)
+            validation_seconds += time.perf_counter() - step
+
+            # Morceau entièrement rejeté : rien à scorer (un modèle sklearn refuse une matrice vide)
+            if len(features):
+                step = time.perf_counter()
+                groups = unique_rows(features) if self.dedupe else None
+                chunk_dedupe_seconds = time.perf_counter() - step
+                dedupe_seconds += chunk_dedupe_seconds
+
+                step = time.perf_counter()
+                results = self.score_chunk(features, transaction_ids[valid], schema.amounts(chunk, features, valid), scorer, groups)
+                chunk_scoring_seconds = time.perf_counter() - step
+                results_rows = store.append(results)
+                scoring_seconds += time.perf_counter() - step
+                frauds += int(np.count_nonzero(results['is_fraud']))
+                if groups is not None:
+                    # Temps évité (estimation) : coût moyen d'une ligne scorée dans ce morceau x lignes
+                    # non rescorées, moins le coût de la déduplication ; aucun scoring supplémentaire
+                    n_scored = len(groups[0])
+                    duplicates += len(features) - n_scored
+                    if n_scored:
+                        seconds_saved += chunk_scoring_seconds / n_scored * (len(features) - n_scored) - chunk_dedupe_seconds
+
+            rows += len(chunk)
+            rejected += n_rejected
+            seconds = state['seconds'] + time.perf_counter() - start
+            self.save_checkpoint(store, {
+                'rows': rows,
+                'offset': offset,
+                'results_rows': results_rows,
+                'rejects_bytes': os.path.getsize(rejects_path) if rejects_path and os.path.exists(rejects_path) else 0,
+                'frauds': frauds,
+                'rejected': rejected,
+                'seconds': seconds,
+                'duplicates': duplicates,
+                'seconds_saved': seconds_saved
+            })
+            if progress is not None:
+                progress(rows, frauds, rejected, seconds)
+
+        seconds = state['seconds'] + time.perf_counter() - start
+        summary = {
+            'rows': rows,
+            'frauds': frauds,
+            'rejected': rejected,
+            'duplicates': duplicates,
+            'seconds_saved': round(seconds_saved, 3),
+            'resumed_from': resumed_from,
+            'seconds': round(seconds, 3),
+            'validation_seconds': round(validation_seconds, 3),
+            'scoring_seconds': round(scoring_seconds, 3),
+            'dedupe_seconds': round(dedupe_seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None
+        }
+        logger.info(f"Lot scoré: {rows} lignes ({rejected} rejetées, {duplicates} doublons) en {seconds:.2f}s "
+                    f"({summary['rows_per_second']} lignes/s, validation {validation_seconds:.2f}s, scoring {scoring_seconds:.2f}s)")
+        return summary
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import logging
+import re
+from model.scoring_engine import FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Type et bornes (incluses) de chaque feature, d'après data/creditcarddata.csv
+FEATURE_SPECS = {
+    'TransactionAmount': ('float32', 0, None),
+    'TransactionHour': ('int8', 0, 23),
+    'DayOfWeek': ('int8', 1, 7),
+    'IsWeekend': ('int8', 0, 1),
+    'CustomerHistory': ('float32', None, None),
+    'MerchantRisk': ('int8', 1, 5),
+    'LocationMismatch': ('int8', 0, 1),
+    'DeviceChange': ('int8', 0, 1),
+    'Velocity_1h': ('float32', 0, None),
+    'Velocity_24h': ('float32', 0, None),
+    'AvgTransaction': ('float32', None, None),
+    'CustomerAge': ('int8', 0, 120),
+    'AccountAgeDays': ('float32', 0, None),
+}
+
+
+def normalize_header(name):
+    """Forme canonique d'un en-tête: minuscules, sans espaces ni ponctuation"""
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+class BatchSchema:
+    """Schéma d'entrée des fichiers de lots, compilé une fois par fichier à partir de l'en-tête.
+
+    Les en-têtes sont rapprochés des 13 colonnes du modèle (noms de creditcarddata.csv,
+    sans tenir compte de la casse ni de la ponctuation, ou alias feature_1 ... feature_13).
+    validate() convertit et contrôle un morceau entier en opérations vectorisées et
+    sépare les lignes valides des lignes rejetées, avec le motif de rejet.
+    """
+
+    def __init__(self, mapping, amount_column=None):
+        # mapping: colonne du modèle -> en-tête du fichier
+        self.mapping = mapping
+        self.amount_column = amount_column
+
+    @classmethod
+    def from_header(cls, columns):
+        """Construit le schéma ; lève ValueError si des colonnes du modèle sont absentes"""
+        by_name = {normalize_header(column): column for column in columns}
+        mapping, missing = {}, []
+        for index, feature in enumerate(FEATURE_COLUMNS, start=1):
+            header = by_name.get(normalize_header(feature)) or by_name.get(f'feature{index}')
+            if header is None:
+                missing.append(feature)
+            else:
+                mapping[feature] = header
+        if missing:
+            raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+        return cls(mapping, by_name.get('amount'))
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls.from_header(pd.read_csv(path, nrows=0).columns)
+
+    @property
+    def columns(self):
+        """En-têtes du fichier à lire (les autres colonnes ne sont jamais chargées)"""
+        columns = list(self.mapping.values())
+        if self.amount_column is not None and self.amount_column not in columns:
+            columns.append(self.amount_column)
+        return columns
+
+    def validate(self, df):
+        """Retourne (features float32 (n_valides, 13), masque des lignes valides, motifs de rejet)"""
+        n = len(df)
+        features = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+        reasons = np.full(n, '', dtype=object)
+
+        for index, feature in enumerate(FEATURE_COLUMNS):
+            dtype, low, high = FEATURE_SPECS[feature]
+            raw = df[self.mapping[feature]]
+            values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64)
+
+            missing = np.isnan(values)
+            if missing.any():
+                not_numeric = missing & raw.notna().to_numpy()
+                reasons[not_numeric] += f'{feature}: non numérique; '
+                reasons[missing & ~not_numeric] += f'{feature}: valeur manquante; '
+
+            with np.errstate(invalid='ignore', over='ignore'):
+                # Finies en float64 mais infinies une fois stockées en float32 (|x| > 3.4e38)
+                invalid = ~missing & ~np.isfinite(values.astype(np.float32))
+                if low is not None:
+                    invalid |= values < low
+                if high is not None:
+                    invalid |= values > high
+            if invalid.any():
+                reasons[invalid] += f'{feature}: hors plage; '
+            if dtype == 'int8':
+                not_integer = ~missing & ~invalid & (values != np.round(values))
+                if not_integer.any():
+                    reasons[not_integer] += f'{feature}: entier attendu; '
+
+            with np.errstate(over='ignore'):
+                features[:, index] = values
+
+        # Ligne vide (conservée à la lecture du CSV pour que la numérotation suive le fichier) : un seul motif
+        blank = df.isna().all(axis=1).to_numpy()
+        if blank.any():
+            reasons[blank] = 'ligne vide; '
+
+        valid = reasons == ''
+        return features[valid], valid, reasons
+
+    def amounts(self, df, features, valid):
+        """Montant affiché: colonne 'amount' si présente, sinon TransactionAmount"""
+        if self.amount_column is not None:
+            amounts = pd.to_numeric(df[self.amount_column], errors='coerce').to_numpy(dtype=np.float64)[valid]
+            return np.where(np.isnan(amounts), features[:, 0], amounts)
+        return features[:, 0].astype(np.float64)
@@ -0,0 +1,101 @@
+import numpy as np
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnarStore:
+    """Stockage colonnaire en ajout seul pour les résultats de lots.
+
+    Chaque colonne est un fichier binaire brut <colonne>.bin (dtype fixe) ; meta.json
+    donne le schéma et le nombre de lignes validées. Les lignes sont d'abord ajoutées
+    aux colonnes puis validées par le remplacement atomique de meta.json : un lecteur
+    ne voit jamais une ligne partielle. La lecture passe par np.memmap et ne charge
+    que la tranche demandée.
+    """
+
+    META = 'meta.json'
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        meta_path = os.path.join(path, self.META)
+        if schema is None:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.schema = {name: np.dtype(dtype) for name, dtype in meta['columns'].items()}
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.schema = {name: np.dtype(dtype) for name, dtype in schema.items()}
+            if not os.path.exists(meta_path):
+                self._write_meta(0)
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    def column_path(self, name):
+        return os.path.join(self.path, f'{name}.bin')
+
+    def __len__(self):
+        try:
+            with open(os.path.join(self.path, self.META)) as f:
+                return json.load(f)['rows']
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def _write_meta(self, rows):
+        meta_path = os.path.join(self.path, self.META)
+        with open(f'{meta_path}.tmp', 'w') as f:
+            json.dump({'rows': rows, 'columns': {name: dtype.str for name, dtype in self.schema.items()}}, f)
+        os.replace(f'{meta_path}.tmp', meta_path)
+
+    def append(self, columns):
+        """Ajoute un bloc de lignes (dict colonne -> tableau de même longueur) ; retourne le total validé"""
+        rows = len(self)
+        lengths = {len(columns[name]) for name in self.schema}
+        if len(lengths) != 1:
+            raise ValueError("Toutes les colonnes doivent avoir la même longueur")
+
+        for name, dtype in self.schema.items():
+            with open(self.column_path(name), 'r+b' if os.path.exists(self.column_path(name)) else 'wb') as f:
+                # Écrase une éventuelle fin non validée (écriture interrompue)
+                f.seek(rows * dtype.itemsize)
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                f.truncate()
+
+        rows += lengths.pop()
+        self._write_meta(rows)
+        return rows
+
+    def truncate(self, rows):
+        """Ramène le stockage à ses rows premières lignes (reprise après interruption)"""
+        if rows > len(self):
+            raise ValueError(f"Impossible de tronquer à {rows} lignes: {len(self)} lignes validées")
+        self._write_meta(rows)
+        for name, dtype in self.schema.items():
+            if os.path.exists(self.column_path(name)):
+                with open(self.column_path(name), 'r+b') as f:
+                    f.truncate(rows * dtype.itemsize)
+
+    def read(self, start=0, stop=None):
+        """Retourne un dict colonne -> tableau pour les lignes [start, stop)"""
+        rows = len(self)
+        stop = rows if stop is None else min(stop, rows)
+        start = max(0, min(start, stop))
+        result = {}
+        for name, dtype in self.schema.items():
+            if stop == start:
+                result[name] = np.empty(0, dtype=dtype)
+                continue
+            data = np.memmap(self.column_path(name), dtype=dtype, mode='r', shape=(rows,))
+            result[name] = np.array(data[start:stop])
+            del data
+        return result
+
+    def iter_chunks(self, chunk_size=50000):
+        """Parcourt toutes les lignes validées par blocs"""
+        rows = len(self)
+        for start in range(0, rows, chunk_size):
+            yield self.read(start, start + chunk_size)
@@ -0,0 +1,126 @@
+import numpy as np
+import logging
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from model.scoring_engine import N_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# État hérité par les processus du pool au fork : moteur, version figée, vues sur la mémoire partagée
+_worker_state = {}
+
+
+def _score_range(bounds):
+    """Score les lignes [start, stop) de la matrice partagée dans le tableau de sortie partagé"""
+    start, stop = bounds
+    engine, active = _worker_state['engine'], _worker_state['active']
+    X, out = _worker_state['features'], _worker_state['output']
+    out[start:stop] = engine.score_loaded(active, X[start:stop])
+    return stop - start
+
+
+class ParallelScorer:
+    """Scoring par lots multi-processus sur une matrice de features en mémoire partagée.
+
+    Les features d'un morceau sont copiées une fois dans un segment shared_memory ;
+    les processus du pool (créés par fork, donc avec le modèle déjà chargé) scorent
+    des plages de lignes disjointes et écrivent dans un tableau de sortie partagé.
+    Seules les bornes (start, stop) transitent par le pool, jamais les données.
+
+    La version du modèle est figée à l'entrée du bloc with (pinned) : tout le lot est
+    scoré avec la même version, y compris les morceaux scorés sans le pool. Sans fork disponible, avec un seul worker, ou depuis un
+    processus daemon (worker Celery prefork, qui ne peut pas avoir d'enfants),
+    le scoring reste séquentiel dans le processus courant.
+    """
+
+    def __init__(self, scoring_engine, workers=None, capacity=50000, min_rows=10000, tasks_per_worker=4):
+        self.scoring_engine = scoring_engine
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = capacity
+        # En dessous de ce nombre de lignes, l'aller-retour vers le pool coûte plus qu'il ne rapporte
+        self.min_rows = min_rows
+        self.tasks_per_worker = tasks_per_worker
+        self.pinned = None
+        self._pool = None
+        self._segments = []
+
+    @property
+    def parallel(self):
+        return self._pool is not None
+
+    def available(self):
+        """Le mode multi-processus est-il utilisable depuis ce processus ?"""
+        if self.workers <= 1:
+            return False
+        if multiprocessing.current_process().daemon:
+            logger.warning("Processus daemon (worker Celery prefork): scoring par lots séquentiel")
+            return False
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    def __enter__(self):
+        # Version figée pour tout le lot, même si le moteur bascule entre deux morceaux
+        self.pinned = self.scoring_engine.active
+        if self.available():
+            try:
+                self._open()
+            except Exception as e:
+                logger.error(f"Erreur démarrage du pool de scoring: {str(e)}")
+                self.close()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        self.pinned = None
+        return False
+
+    def _open(self):
+        active = self.pinned
+        if active is None:
+            raise RuntimeError("Aucun modèle disponible pour le scoring")
+
+        features_shm = shared_memory.SharedMemory(create=True, size=self.capacity * N_FEATURES * 8)
+        output_shm = shared_memory.SharedMemory(create=True, size=self.capacity * 8)
+        self._segments = [features_shm, output_shm]
+
+        _worker_state.update({
+            'engine': self.scoring_engine,
+            'active': active,
+            'features': np.ndarray((self.capacity, N_FEATURES), dtype=np.float64, buffer=features_shm.buf),
+            'output': np.ndarray(self.capacity, dtype=np.float64, buffer=output_shm.buf)
+        })
+        # Fork après la préparation de l'état : les enfants héritent du modèle et des segments mappés
+        self._pool = multiprocessing.get_context('fork').Pool(self.workers)
+        logger.info(f"Pool de scoring: {self.workers} processus, {self.capacity} lignes par passe")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        _worker_state.clear()
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def score(self, X):
+        """Probabilité de fraude de chaque ligne de X (plages réparties sur le pool)"""
+        X = self.scoring_engine.as_matrix(X)
+        if self.pinned is None:
+            self.pinned = self.scoring_engine.active
+            if self.pinned is None:
+                raise RuntimeError("Aucun modèle disponible pour le scoring")
+        if self._pool is None or len(X) < self.min_rows:
+            return self.scoring_engine.score_loaded(self.pinned, X)
+
+        probabilities = np.empty(len(X), dtype=np.float64)
+        features, output = _worker_state['features'], _worker_state['output']
+        for offset in range(0, len(X), self.capacity):
+            block = X[offset:offset + self.capacity]
+            n = len(block)
+            features[:n] = block
+            edges = np.linspace(0, n, min(n, self.workers * self.tasks_per_worker) + 1).astype(int)
+            self._pool.map(_score_range, list(zip(edges[:-1], edges[1:])))
+            probabilities[offset:offset + n] = output[:n]
+        return probabilities
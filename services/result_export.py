@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+BATCH_EXPORT_COLUMNS = ['transaction_id', 'amount', 'prediction', 'confidence', 'fraud_probability']
+HISTORY_EXPORT_COLUMNS = ['id', 'created_at', 'prediction', 'confidence', 'amount', 'currency',
+                          'model_version', 'is_degraded', 'is_fraud_confirmed']
+
+
+def _encode(frame, format_type, header):
+    """Sérialise un bloc de lignes (un seul appel pandas par bloc)"""
+    if format_type == 'csv':
+        return frame.to_csv(header=header, index=False, float_format='%.6f')
+    lines = frame.to_json(orient='records', lines=True, force_ascii=False, date_format='iso', double_precision=6)
+    return lines if lines.endswith('\n') else lines + '\n'
+
+
+def _batch_frame(columns):
+    is_fraud = columns['is_fraud'].astype(bool)
+    probabilities = columns['fraud_probability'].astype(np.float64)
+    return pd.DataFrame({
+        'transaction_id': columns['transaction_id'],
+        'amount': columns['amount'],
+        'prediction': np.where(is_fraud, 'Fraude', 'Sécurisé'),
+        'confidence': np.where(is_fraud, probabilities, 1 - probabilities),
+        'fraud_probability': probabilities
+    }, columns=BATCH_EXPORT_COLUMNS)
+
+
+def export_batch_results(store, format_type='csv', chunk_size=10000):
+    """Générateur: résultats d'un lot lus par tranches du stockage colonnaire"""
+    if format_type == 'csv':
+        yield ','.join(BATCH_EXPORT_COLUMNS) + '\n'
+
+    for columns in store.iter_chunks(chunk_size):
+        yield _encode(_batch_frame(columns), format_type, header=False)
+
+
+def export_batch_parquet(store, path, chunk_size=100000):
+    """Écrit les résultats d'un lot dans un fichier Parquet (un row group par tranche) et retourne son chemin
+
+    Le fichier est conservé à côté des résultats et réutilisé tant que le lot n'a pas changé.
+    """
+    if pq is None:
+        raise ValueError("pyarrow est requis pour l'export Parquet")
+    meta_path = os.path.join(store.path, store.META)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(meta_path):
+        return path
+
+    writer = None
+    try:
+        for columns in store.iter_chunks(chunk_size):
+            table = pa.Table.from_pandas(_batch_frame(columns), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(f'{path}.tmp', table.schema, compression='snappy')
+            writer.write_table(table)
+        if writer is None:
+            table = pa.Table.from_pandas(_batch_frame(store.read(0, 0)), preserve_index=False)
+            writer = pq.ParquetWriter(f'{path}.tmp', table.schema, compression='snappy')
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def export_prediction_history(query, format_type='csv', chunk_size=1000):
+    """Générateur: historique lu avec un curseur côté serveur (yield_per), bloc par bloc"""
+    if format_type == 'csv':
+        yield ','.join(HISTORY_EXPORT_COLUMNS) + '\n'
+
+    rows = []
+    for prediction in query.yield_per(chunk_size):
+        rows.append([getattr(prediction, column) for column in HISTORY_EXPORT_COLUMNS])
+        if len(rows) >= chunk_size:
+            yield _encode(pd.DataFrame(rows, columns=HISTORY_EXPORT_COLUMNS), format_type, header=False)
+            rows = []
+    if rows:
+        yield _encode(pd.DataFrame(rows, columns=HISTORY_EXPORT_COLUMNS), format_type, header=False)
@@ -0,0 +1,160 @@
+import joblib
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+
+from config import TestingConfig
+from model.scoring_engine import ScoringEngine, FEATURE_COLUMNS
+from services.batch_processor import BatchProcessor, RESULT_SCHEMA
+from services.columnar_store import ColumnarStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Processus interrompu par os._exit (aucun nettoyage, comme un worker tué) juste après
+# l'ajout de CRASH_AFTER morceaux aux résultats, avant l'écriture du point de contrôle
+CRASH_SCRIPT = textwrap.dedent('''
+    import os, sys
+    sys.path.insert(0, {root!r})
+    from config import TestingConfig
+    from model.scoring_engine import ScoringEngine
+    from services.batch_processor import BatchProcessor, RESULT_SCHEMA
+    from services.columnar_store import ColumnarStore
+
+    appended = 0
+    original_append = ColumnarStore.append
+
+    def append(self, columns):
+        global appended
+        rows = original_append(self, columns)
+        appended += 1
+        if appended == {crash_after}:
+            os._exit(17)
+        return rows
+
+    ColumnarStore.append = append
+    engine = ScoringEngine({model_dir!r}, mmap=False)
+    processor = BatchProcessor(engine, upload_dir={upload_dir!r}, chunk_size=TestingConfig.BATCH_CHUNK_ROWS,
+                               dedupe=TestingConfig.BATCH_DEDUPE)
+    processor.process_file({input_path!r}, ColumnarStore({store_path!r}, RESULT_SCHEMA), rejects_path={rejects_path!r})
+''')
+
+
+class BatchResumeTest(unittest.TestCase):
+    """Traitement par lot tué en cours de route puis relancé : résultat identique à un traitement d'une traite"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp(prefix='batch_resume_')
+        data = pd.read_csv(os.path.join(ROOT, 'data', 'creditcarddata.csv'))
+
+        # Modèle réel (régression logistique) chargé par le moteur de scoring depuis model_dir
+        cls.model_dir = os.path.join(cls.tmp_dir, 'model')
+        os.makedirs(cls.model_dir)
+        scaler = StandardScaler().fit(data[FEATURE_COLUMNS].to_numpy())
+        model = LogisticRegression(max_iter=1000).fit(scaler.transform(data[FEATURE_COLUMNS].to_numpy()),
+                                                      data['PotentialFraud'])
+        joblib.dump(model, os.path.join(cls.model_dir, 'fraud_model.pkl'))
+        joblib.dump(scaler, os.path.join(cls.model_dir, 'scaler.pkl'))
+
+        # 99 enregistrements : doublons, lignes vides, champ entre guillemets sur plusieurs
+        # lignes, ligne invalide et dernière ligne sans retour à la ligne final
+        rows = data[FEATURE_COLUMNS].head(80).copy()
+        rows['note'] = ''
+        rows.iloc[3, rows.columns.get_loc('note')] = 'appel client\nrappel demandé'
+        rows.iloc[27, rows.columns.get_loc('note')] = 'ligne 1\nligne 2\nligne 3'
+        rows.iloc[41, rows.columns.get_loc('TransactionHour')] = 31
+        rows = pd.concat([rows, rows.iloc[10:25]], ignore_index=True)
+        records = [rows.iloc[[index]].to_csv(index=False, header=False) for index in range(len(rows))]
+        for position in (5, 38, 39, 77):
+            records.insert(position, '\n')
+        cls.input_path = os.path.join(cls.tmp_dir, 'input.csv')
+        with open(cls.input_path, 'w') as f:
+            f.write(rows.iloc[:0].to_csv(index=False) + ''.join(records).rstrip('\n'))
+
+        cls.engine = ScoringEngine(cls.model_dir, mmap=False)
+        cls.expected, cls.expected_rejects, cls.expected_summary = cls.run_batch('reference')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def processor(cls):
+        return BatchProcessor(cls.engine, upload_dir=cls.tmp_dir, chunk_size=TestingConfig.BATCH_CHUNK_ROWS,
+                              dedupe=TestingConfig.BATCH_DEDUPE)
+
+    @classmethod
+    def paths(cls, name):
+        return os.path.join(cls.tmp_dir, f'{name}_results'), os.path.join(cls.tmp_dir, f'{name}_rejects.csv')
+
+    @classmethod
+    def run_batch(cls, name):
+        store_path, rejects_path = cls.paths(name)
+        summary = cls.processor().process_file(cls.input_path, ColumnarStore(store_path, RESULT_SCHEMA),
+                                               rejects_path=rejects_path)
+        with open(rejects_path) as f:
+            rejects = f.read()
+        return ColumnarStore(store_path).read(), rejects, summary
+
+    def crash(self, name, crash_after):
+        store_path, rejects_path = self.paths(name)
+        script = CRASH_SCRIPT.format(root=ROOT, crash_after=crash_after, model_dir=self.model_dir,
+                                     upload_dir=self.tmp_dir, input_path=self.input_path,
+                                     store_path=store_path, rejects_path=rejects_path)
+        process = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 17, process.stderr)
+
+    def test_reference_numbers_every_line(self):
+        # 95 transactions + 4 lignes vides ; rejetées : les lignes vides et l'heure 31
+        self.assertEqual(self.expected_summary['rows'], 99)
+        self.assertEqual(self.expected_summary['rejected'], 5)
+        self.assertEqual(len(self.expected['transaction_id']), 94)
+        self.assertIn('ligne vide', self.expected_rejects)
+        self.assertIn('TransactionHour: hors plage', self.expected_rejects)
+
+    def test_chunk_with_only_invalid_rows_is_not_scored(self):
+        # 15 premières lignes invalides : le premier morceau (10 lignes) est entièrement rejeté
+        rows = pd.read_csv(self.input_path).dropna(subset=FEATURE_COLUMNS).head(40)
+        rows.iloc[:15, rows.columns.get_loc('TransactionHour')] = 31
+        input_path = os.path.join(self.tmp_dir, 'invalid_head.csv')
+        rows.to_csv(input_path, index=False)
+        store_path, rejects_path = self.paths('invalid_head')
+
+        summary = self.processor().process_file(input_path, ColumnarStore(store_path, RESULT_SCHEMA),
+                                                rejects_path=rejects_path)
+        results = ColumnarStore(store_path).read()
+
+        self.assertEqual(summary['rows'], 40)
+        self.assertEqual(summary['rejected'], 15)
+        np.testing.assert_array_equal(results['transaction_id'], np.arange(16, 41))
+        self.assertEqual(self.processor().load_checkpoint(ColumnarStore(store_path))['rows'], 40)
+        with open(rejects_path) as f:
+            self.assertEqual(f.read().count('TransactionHour: hors plage'), 15)
+
+    def test_resume_after_crash_has_no_duplicated_or_missing_rows(self):
+        for crash_after in (1, 2, 3, 5, 9):
+            with self.subTest(crash_after=crash_after):
+                name = f'crash_{crash_after}'
+                self.crash(name, crash_after)
+                results, rejects, summary = self.run_batch(name)
+
+                self.assertEqual(summary['resumed_from'], (crash_after - 1) * TestingConfig.BATCH_CHUNK_ROWS)
+                self.assertEqual(summary['rows'], self.expected_summary['rows'])
+                self.assertEqual(summary['rejected'], self.expected_summary['rejected'])
+                self.assertEqual(summary['duplicates'], self.expected_summary['duplicates'])
+                self.assertEqual(len(np.unique(results['transaction_id'])), len(results['transaction_id']))
+                for column in RESULT_SCHEMA:
+                    np.testing.assert_array_equal(results[column], self.expected[column])
+                self.assertEqual(rejects, self.expected_rejects)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import unittest
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+
+from model.scoring_engine import FEATURE_COLUMNS
+from model.tree_compiler import CompiledForest, compile_ensemble, check_parity
+
+try:
+    from xgboost import XGBClassifier
+except ImportError:
+    XGBClassifier = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TreeCompilerParityTest(unittest.TestCase):
+    """Probabilités de l'ensemble compilé identiques au predict_proba natif (tolérance 1e-6)"""
+
+    @classmethod
+    def setUpClass(cls):
+        data = pd.read_csv(os.path.join(ROOT, 'data', 'creditcarddata.csv')).dropna()
+        cls.X = data[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        cls.y = data['PotentialFraud'].to_numpy()
+        rng = np.random.default_rng(0)
+        # Lignes d'entraînement bruitées, plus des valeurs exactement égales aux seuils via les lignes d'origine
+        noisy = cls.X[rng.integers(0, len(cls.X), 2000)] + rng.normal(0, 0.1, (2000, cls.X.shape[1])) * cls.X.std(axis=0)
+        cls.X_eval = np.vstack([cls.X, noisy])
+
+    def assert_parity(self, model):
+        forest = compile_ensemble(model.fit(self.X, self.y))
+        self.assertIsNotNone(forest)
+        max_diff, ok = check_parity(model, forest, self.X_eval)
+        self.assertTrue(ok, f"écart maximal {max_diff}")
+        for size in (1, 16):
+            np.testing.assert_allclose(forest.predict_proba(self.X_eval[:size]), model.predict_proba(self.X_eval[:size]),
+                                       atol=1e-6)
+        return forest
+
+    def test_random_forest(self):
+        self.assert_parity(RandomForestClassifier(n_estimators=20, random_state=42))
+
+    def test_gradient_boosting(self):
+        self.assert_parity(GradientBoostingClassifier(n_estimators=50, random_state=42))
+
+    @unittest.skipIf(XGBClassifier is None, "xgboost non installé")
+    def test_xgboost_with_missing_values(self):
+        model = XGBClassifier(n_estimators=50, random_state=42, eval_metric='logloss')
+        forest = self.assert_parity(model)
+        X_missing = self.X_eval[:500].copy()
+        X_missing[::7, 0] = np.nan
+        X_missing[::11, 5] = np.nan
+        max_diff, ok = check_parity(model, forest, X_missing)
+        self.assertTrue(ok, f"écart maximal {max_diff} avec valeurs manquantes")
+
+    def test_saved_arrays_reload_memory_mapped(self):
+        model = RandomForestClassifier(n_estimators=5, random_state=42).fit(self.X, self.y)
+        forest = compile_ensemble(model)
+        with tempfile.TemporaryDirectory() as path:
+            forest.save(path)
+            loaded = CompiledForest.load(path, mmap_mode='r')
+            np.testing.assert_array_equal(loaded.predict_proba(self.X_eval), forest.predict_proba(self.X_eval))
+
+
+if __name__ == '__main__':
+    unittest.main()